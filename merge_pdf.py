@@ -2,31 +2,40 @@ import glob
 from argparse import ArgumentParser
 from pathlib import Path
 
-from PyPDF2 import PdfMerger
 from tqdm import tqdm
 
+from technical_instruction_generator.merge import PdfStreamMerger, linearize_pdf
+
 
 def main():
     parser = ArgumentParser()
     parser.add_argument('-i', '--input', type=str, required=True)
     parser.add_argument('-o', '--output', type=str, required=False)
+    parser.add_argument('-a', '--append', action='store_true', help="append to the output instead of replacing it")
+    parser.add_argument('-l', '--linearize', action='store_true', help="write a linearized PDF for fast web view")
 
     args = parser.parse_args()
 
     pdf_paths = sorted(glob.glob(args.input))
-    path = args.output
+    if not pdf_paths:
+        parser.error(f"no PDFs match {args.input}")
 
-    if path is None:
+    if args.output is None:
         path = Path(pdf_paths[0]).parent / f"{Path(pdf_paths[0]).stem}_merged.pdf"
+        # the merged PDF of an earlier run matches the same pattern
+        pdf_paths = [pdf for pdf in pdf_paths if Path(pdf).resolve() != path.resolve()]
+    else:
+        path = Path(args.output)
+        # the output is opened for writing before the inputs are read
+        if any(Path(pdf).resolve() == path.resolve() for pdf in pdf_paths):
+            parser.error(f"the output {path} is also an input")
 
     # merge PDFs
-    merger = PdfMerger()
-    for pdf in tqdm(pdf_paths, 'mergings pdfs'):
-        merger.append(pdf)
-    print("writing final pdf..", end=" ", flush=True)
-    merger.write(path)
-    merger.close()
-    print("done.")
+    with PdfStreamMerger(path, append=args.append) as merger:
+        for pdf in tqdm(pdf_paths, 'mergings pdfs'):
+            merger.append(pdf)
+    if args.linearize:
+        linearize_pdf(path)
 
 
 if __name__ == "__main__":
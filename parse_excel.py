@@ -5,6 +5,7 @@ from itertools import product
 
 import pandas as pd
 
+from technical_instruction_generator.cache import RenderCache
 from technical_instruction_generator.instructions import Instructions
 from technical_instruction_generator.layout_base import LayoutDirection
 from technical_instruction_generator.steps.bodies import Bar, CutFaceStep, Face, ModifyBarStep, ModifyMultiBodyStep, \
@@ -329,7 +330,7 @@ def main_drillings():
     print(f"\nAnzahl Schritte: {len(steps)}")
 
     instructions = Instructions(steps, 'Tims Hochbett (Bohrungen)')
-    instructions.save_pdf('output/2_bohrungen.pdf')
+    instructions.save_pdf('output/2_bohrungen.pdf', cache=RenderCache('output/.cache'))
 
 
 def main_cuts():
@@ -362,7 +363,7 @@ def main_cuts():
     print(base_counts)
 
     instructions = Instructions(steps, 'Tims Hochbett (Schnitte)')
-    instructions.save_pdf('output/1_schnitte.pdf')
+    instructions.save_pdf('output/1_schnitte.pdf', cache=RenderCache('output/.cache'))
 
 
 if __name__ == "__main__":
@@ -0,0 +1,153 @@
+"""Persistent, content-addressed cache of rendered pages.
+
+A page is looked up by a key hashing everything it is drawn from: its steps with their histories and numbers, the
+page number and title, the render options, the source of this package (including the style and dimension constants)
+and the versions of the libraries writing it. Pages whose key did not change since the last export are reused byte
+for byte instead of being rendered and converted again.
+"""
+import hashlib
+import os
+import tempfile
+from enum import Enum
+from functools import cache
+from importlib import metadata
+from pathlib import Path
+
+from .history import StepIndex
+from .steps.base import Step
+from .steps.bodies import Body
+
+RENDER_CACHE_VERSION = 1  # increase when the format of the entries changes
+KEY_LIBRARIES = ('drawsvg', 'lxml')
+
+
+class RenderCache:
+    """Stores cache entries as `<key[:2]>/<key><suffix>` files in `directory`.
+
+    The entries are limited to `max_size` bytes in total. When they grow beyond it, the least recently used entries
+    (by modification time, which is updated on every hit) are deleted until the cache is a tenth below the limit.
+    Entries are written atomically, so several processes can share a cache.
+    """
+
+    def __init__(self, directory: str | Path | os.PathLike, max_size: int = 512 * 2**20) -> None:
+        self.directory = Path(directory)
+        self.max_size = max_size
+        self._size: int | None = None
+
+    def get(self, key: str, suffix: str) -> bytes | None:
+        path = self._get_path(key, suffix)
+        try:
+            data = path.read_bytes()
+            os.utime(path)
+        except FileNotFoundError:
+            return None
+        return data
+
+    def put(self, key: str, suffix: str, data: bytes) -> None:
+        path = self._get_path(key, suffix)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        file, tmp_path = tempfile.mkstemp(dir=path.parent, prefix=".tmp-")
+        try:
+            with os.fdopen(file, 'wb') as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+        except BaseException:
+            Path(tmp_path).unlink(missing_ok=True)
+            raise
+
+        if self._size is None:
+            self._size = sum(size for size, _, _ in self._scan())
+        else:
+            self._size += len(data)
+        if self._size > self.max_size:
+            self._evict()
+
+    def _get_path(self, key: str, suffix: str) -> Path:
+        return self.directory / key[:2] / f"{key}{suffix}"
+
+    def _scan(self) -> list[tuple[int, float, Path]]:
+        entries = []
+        for path in self.directory.glob("*/*"):
+            if path.name.startswith(".tmp-"):
+                continue
+            try:
+                stat = path.stat()
+            except FileNotFoundError:  # evicted by another process
+                continue
+            entries.append((stat.st_size, stat.st_mtime, path))
+        return entries
+
+    def _evict(self) -> None:
+        # other processes may have added or evicted entries, so the size is recounted before evicting
+        entries = self._scan()
+        self._size = sum(size for size, _, _ in entries)
+        for size, _, path in sorted(entries, key=lambda entry: entry[1]):
+            if self._size <= self.max_size * 0.9:
+                break
+            path.unlink(missing_ok=True)
+            self._size -= size
+
+
+def make_key(*parts: object) -> str:
+    """Return a hex digest of the fingerprints of `parts`."""
+    return hashlib.blake2b(get_fingerprint(parts).encode(), digest_size=20).hexdigest()
+
+
+def get_fingerprint(obj: object) -> str:
+    """Return a canonical string representation of `obj` and the objects it references.
+
+    Objects are represented by their class and attributes, so two steps have the same fingerprint if they are
+    constructed from the same arguments, even though they are not `==`.
+    """
+    memo: dict[int, int] = {}
+
+    def walk(obj: object) -> str:
+        if obj is None or isinstance(obj, (bool, int, float, str, bytes)):
+            return repr(obj)
+        if isinstance(obj, Enum):
+            return f"{type(obj).__qualname__}.{obj.name}"
+        if isinstance(obj, (list, tuple)):
+            brackets = "[]" if isinstance(obj, list) else "()"
+            return f"{brackets[0]}{','.join(walk(item) for item in obj)}{brackets[1]}"
+        if isinstance(obj, dict):
+            return f"{{{','.join(f'{walk(key)}:{walk(value)}' for key, value in obj.items())}}}"
+        if isinstance(obj, (set, frozenset)):
+            return f"{{{','.join(sorted(walk(item) for item in obj))}}}"
+        if hasattr(obj, 'tolist'):  # numpy arrays and scalars
+            return walk(obj.tolist())
+
+        if id(obj) in memo:
+            return f"@{memo[id(obj)]}"
+        memo[id(obj)] = len(memo)
+        attributes = vars(obj) if hasattr(obj, '__dict__') else repr(obj)
+        return f"{type(obj).__module__}.{type(obj).__qualname__}{walk(attributes)}"
+
+    return walk(obj)
+
+
+def get_step_keys(steps: list[Step]) -> list[str]:
+    """Return a key per step, covering the step, its number and its history (see `StepIndex.get_history`)."""
+    # digest of the steps modifying each body so far, chained in step order
+    body_digests: dict[Body, str] = {}
+    keys = []
+    for step_idx, step in enumerate(steps):
+        step_id = step.identifier or f"{step_idx + 1}"
+        step_digest = make_key(step)
+        bodies = StepIndex.get_bodies(step)
+        keys.append(make_key(step_digest, step_id, sorted(body_digests.get(body, "") for body in bodies)))
+        for body in bodies:
+            body_digests[body] = make_key(body_digests.get(body, ""), step_digest)
+    return keys
+
+
+@cache
+def get_source_key() -> str:
+    """Return a key covering the source of this package and the versions of the libraries used to render."""
+    package_dir = Path(__file__).parent
+    digest = hashlib.blake2b(f"{RENDER_CACHE_VERSION}".encode(), digest_size=20)
+    for library in KEY_LIBRARIES:
+        digest.update(f"{library} {metadata.version(library)}\n".encode())
+    for path in sorted(package_dir.rglob("*.py")):
+        digest.update(path.relative_to(package_dir).as_posix().encode())
+        digest.update(path.read_bytes())
+    return digest.hexdigest()
@@ -0,0 +1,21 @@
+from dataclasses import dataclass, field
+
+from .history import HistoryCache, StepIndex
+from .layout_base import LabelMode
+
+
+@dataclass(frozen=True)
+class RenderContext:
+    """State of a single rendering of the instructions.
+
+    Everything derived from the steps while rendering lives here instead of on the steps or the instructions, so the
+    same instructions can be rendered several times, also concurrently, with one context each.
+    """
+    step_index: StepIndex
+    label_mode: LabelMode = LabelMode.BACKGROUND
+    resolve_label_overlaps: bool = True
+    level_of_detail: bool = True
+    history_cache: HistoryCache = field(init=False)
+
+    def __post_init__(self) -> None:
+        object.__setattr__(self, 'history_cache', HistoryCache(self.step_index))
@@ -0,0 +1,310 @@
+import asyncio
+import os
+import re
+import shutil
+import subprocess
+import tempfile
+import time
+from abc import ABC, abstractmethod
+from dataclasses import dataclass, field
+from pathlib import Path
+
+INKSCAPE_CANDIDATES = (
+    'inkscape',
+    'C:/Program Files/Inkscape/bin/inkscape.exe',
+)
+
+
+class Converter(ABC):
+    """Converts single SVG pages to PDF, passing both as bytes."""
+    name: str
+
+    @classmethod
+    @abstractmethod
+    def is_available(cls) -> bool:
+        raise NotImplementedError
+
+    @abstractmethod
+    async def convert(self, svg: bytes) -> bytes:
+        raise NotImplementedError
+
+    @property
+    def key(self) -> str:
+        """Identifies the converter and its version, pages converted with the same key are interchangeable."""
+        return self.name
+
+    async def close(self) -> None:
+        """Release the resources (e.g. worker processes) held after converting a batch of pages."""
+
+
+class CairosvgConverter(Converter):
+    """Converts pages in-process with `cairosvg` (optional dependency), avoiding a process start per page."""
+    name = "cairosvg"
+
+    @classmethod
+    def is_available(cls) -> bool:
+        try:
+            import cairosvg  # noqa: F401
+        except (ImportError, OSError):  # OSError: the cairo library itself is missing
+            return False
+        return True
+
+    @property
+    def key(self) -> str:
+        import cairosvg
+
+        return f"{self.name} {cairosvg.__version__}"
+
+    async def convert(self, svg: bytes) -> bytes:
+        import cairosvg
+
+        return await asyncio.to_thread(cairosvg.svg2pdf, bytestring=svg)
+
+
+class InkscapeConverter(Converter):
+    """Converts pages with the command line interface of Inkscape 1.x, piping them through stdin and stdout."""
+    name = "inkscape"
+    min_version = (1, 0)
+
+    def __init__(self, executable: str | None = None) -> None:
+        if executable is None:
+            executable = self.find_executable()
+            if executable is None:
+                raise RuntimeError("Inkscape 1.x was not found")
+        self.executable = executable
+
+    @classmethod
+    def is_available(cls) -> bool:
+        return cls.find_executable() is not None
+
+    @classmethod
+    def find_executable(cls) -> str | None:
+        for candidate in INKSCAPE_CANDIDATES:
+            executable = shutil.which(candidate)
+            if executable is not None and get_inkscape_version(executable) >= cls.min_version:
+                return executable
+        return None
+
+    @property
+    def key(self) -> str:
+        return f"{self.name} {'.'.join(map(str, get_inkscape_version(self.executable)))}"
+
+    async def convert(self, svg: bytes) -> bytes:
+        process = await asyncio.create_subprocess_exec(
+            self.executable,
+            '--pipe',
+            '--export-area-drawing',
+            '--export-type=pdf',
+            '--export-filename=-',
+            stdin=asyncio.subprocess.PIPE,
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.PIPE,
+        )
+        pdf, stderr = await process.communicate(svg)
+        if process.returncode != 0:
+            raise RuntimeError(f"Inkscape failed with exit code {process.returncode}: {stderr.decode().strip()}")
+        return pdf
+
+
+class InkscapeShell:
+    """A long-lived `inkscape --shell` process running one line of actions at a time."""
+    PROMPT = b"> "
+
+    def __init__(self, executable: str, work_dir: Path) -> None:
+        self.executable = executable
+        self.work_dir = work_dir
+        self._process: asyncio.subprocess.Process | None = None
+
+    @property
+    def is_running(self) -> bool:
+        return self._process is not None and self._process.returncode is None
+
+    async def start(self) -> None:
+        self._process = await asyncio.create_subprocess_exec(
+            self.executable,
+            '--shell',
+            stdin=asyncio.subprocess.PIPE,
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.DEVNULL,
+        )
+        await self._read_until_prompt()
+
+    async def run(self, actions: list[str]) -> str:
+        """Run `actions` and return their output. Raises `ConnectionError` if the process has exited."""
+        self._process.stdin.write(f"{';'.join(actions)}\n".encode())
+        await self._process.stdin.drain()
+        return await self._read_until_prompt()
+
+    async def _read_until_prompt(self) -> str:
+        output = bytearray()
+        while True:
+            try:
+                output += await self._process.stdout.readuntil(self.PROMPT)
+                break
+            except asyncio.LimitOverrunError as e:
+                # more output (e.g. warnings) than the stream buffers at once, take it and keep looking for the prompt
+                output += await self._process.stdout.readexactly(e.consumed)
+            except asyncio.IncompleteReadError as e:
+                raise ConnectionError(f"Inkscape exited with code {await self._process.wait()}") from e
+        return output[:-len(self.PROMPT)].decode(errors='replace')
+
+    async def stop(self, timeout: float = 5.0) -> None:
+        if not self.is_running:
+            return
+        try:
+            self._process.stdin.write(b"quit\n")
+            await self._process.stdin.drain()
+            await asyncio.wait_for(self._process.wait(), timeout)
+        except (ConnectionError, asyncio.TimeoutError):
+            self.kill()
+
+    def kill(self) -> None:
+        if self.is_running:
+            self._process.kill()
+        self._process = None
+
+
+class InkscapeShellConverter(InkscapeConverter):
+    """Converts pages with a pool of long-lived Inkscape 1.1+ processes in shell mode.
+
+    Each page is opened, exported and closed with actions sent to an idle process, so Inkscape starts once per worker
+    instead of once per page. The shell cannot read from stdin, so every worker passes its current page through a
+    fixed pair of files in a private temporary directory. A process that exceeds `timeout` on a page is killed and
+    the page fails; a process that crashes is restarted and the page is tried again once. Pages still waiting for a
+    process when the converter is closed fail.
+    """
+    name = "inkscape-shell"
+    min_version = (1, 1)
+
+    def __init__(self, executable: str | None = None, workers: int | None = None, timeout: float = 120.0) -> None:
+        super().__init__(executable)
+        self.workers = workers if workers is not None else os.cpu_count() or 1
+        self.timeout = timeout
+        self._work_dir: tempfile.TemporaryDirectory | None = None
+        self._shells: list[InkscapeShell] = []
+        # `None` in the queue tells the conversions waiting for a shell that the converter was closed
+        self._idle_shells: asyncio.Queue[InkscapeShell | None] | None = None
+
+    async def convert(self, svg: bytes) -> bytes:
+        if self._idle_shells is None:
+            self._work_dir = tempfile.TemporaryDirectory(prefix="inkscape-shell-")
+            self._shells = [
+                InkscapeShell(self.executable, Path(self._work_dir.name) / str(i)) for i in range(self.workers)
+            ]
+            self._idle_shells = asyncio.Queue()
+            for shell in self._shells:
+                shell.work_dir.mkdir()
+                self._idle_shells.put_nowait(shell)
+
+        idle_shells = self._idle_shells
+        shell = await idle_shells.get()
+        if shell is None:
+            idle_shells.put_nowait(None)
+            raise RuntimeError("The converter was closed while the page waited for an Inkscape process")
+
+        svg_path = shell.work_dir / "page.svg"
+        pdf_path = shell.work_dir / "page.pdf"
+        try:
+            svg_path.write_bytes(svg)
+            pdf_path.unlink(missing_ok=True)
+            try:
+                output = await self._export(shell, svg_path, pdf_path)
+            except ConnectionError:
+                if self._idle_shells is not idle_shells:
+                    raise RuntimeError("The converter was closed while converting the page") from None
+                try:
+                    output = await self._export(shell, svg_path, pdf_path)
+                except ConnectionError as e:
+                    raise RuntimeError(f"Inkscape crashed twice: {e}") from e
+
+            if not pdf_path.exists():
+                raise RuntimeError(f"Inkscape did not export the page: {output.strip()}")
+            return pdf_path.read_bytes()
+        finally:
+            idle_shells.put_nowait(shell)
+
+    async def _export(self, shell: InkscapeShell, svg_path: Path, pdf_path: Path) -> str:
+        try:
+            if not shell.is_running:
+                await asyncio.wait_for(shell.start(), self.timeout)
+            return await asyncio.wait_for(shell.run([
+                f'file-open:{svg_path}',
+                'export-area-drawing',
+                'export-type:pdf',
+                f'export-filename:{pdf_path}',
+                'export-do',
+                'file-close',
+            ]), self.timeout)
+        except asyncio.TimeoutError:
+            shell.kill()
+            raise RuntimeError(f"Inkscape timed out after {self.timeout} s") from None
+        except BaseException:
+            # the process is dead or in the middle of a command, start a fresh one for the next page
+            shell.kill()
+            raise
+
+    async def close(self) -> None:
+        shells, idle_shells = self._shells, self._idle_shells
+        self._shells, self._idle_shells = [], None
+        if idle_shells is not None:
+            idle_shells.put_nowait(None)
+        await asyncio.gather(*(shell.stop() for shell in shells))
+        if self._work_dir is not None:
+            self._work_dir.cleanup()
+            self._work_dir = None
+
+
+CONVERTERS: dict[str, type[Converter]] = {
+    CairosvgConverter.name: CairosvgConverter,
+    InkscapeShellConverter.name: InkscapeShellConverter,
+    InkscapeConverter.name: InkscapeConverter,
+}
+
+
+def get_inkscape_version(executable: str) -> tuple[int, ...]:
+    try:
+        output = subprocess.run([executable, '--version'], capture_output=True, text=True, timeout=30).stdout
+    except (OSError, subprocess.TimeoutExpired):
+        return ()
+    match = re.search(r"Inkscape (\d+)\.(\d+)", output)
+    return tuple(int(nr) for nr in match.groups()) if match else ()
+
+
+def get_converter(name: str | None = None) -> Converter:
+    """Return the converter called `name` or, if `name` is `None`, the first available one of `CONVERTERS`."""
+    if name is not None:
+        if name not in CONVERTERS:
+            raise ValueError(f"Unknown converter `{name}`, choose one of {', '.join(CONVERTERS)}")
+        return CONVERTERS[name]()
+
+    for converter_type in CONVERTERS.values():
+        if converter_type.is_available():
+            return converter_type()
+    raise RuntimeError(f"No SVG to PDF converter available, install one of {', '.join(CONVERTERS)}")
+
+
+@dataclass
+class ConversionReport:
+    """Time taken to convert each page."""
+    converter: str
+    page_times: dict[int, float] = field(default_factory=dict)
+
+    async def convert(self, converter: Converter, page_idx: int, svg: bytes) -> bytes:
+        start = time.perf_counter()
+        try:
+            pdf = await converter.convert(svg)
+        except RuntimeError as e:
+            raise RuntimeError(f"Converting page {page_idx + 1} to PDF failed: {e}") from e
+        self.page_times[page_idx] = time.perf_counter() - start
+        return pdf
+
+    def __str__(self) -> str:
+        if not self.page_times:
+            return f"{self.converter}: no pages converted"
+        times = [self.page_times[page_idx] for page_idx in sorted(self.page_times)]
+        lines = [f"page {page_idx + 1:3d}: {self.page_times[page_idx]:.3f} s" for page_idx in sorted(self.page_times)]
+        lines.append(
+            f"{self.converter}: {len(times)} pages, total {sum(times):.3f} s, mean {sum(times) / len(times):.3f} s, "
+            f"max {max(times):.3f} s"
+        )
+        return "\n".join(lines)
@@ -7,8 +7,11 @@ HEADER_TEXT_OFFSET_X = 10
 INSTRUCTION_BOX_STROKE_WIDTH = 2
 INSTRUCTION_BOX_PADDING = 32
 INSTRUCTION_BOX_MARGIN = 32
+INSTRUCTION_BOX_HEIGHT = 400
+STEP_LAYOUT_PADDING = 32
 A4_WIDTH = 2100
 A4_HEIGHT = 2970
+PDF_POINTS_PER_UNIT = 72 / 254  # drawings are in 0.1 mm
 MARGIN_LEFT = 100
 MARGIN_RIGHT = 100
 MARGIN_TOP = 100
@@ -16,6 +19,9 @@ MARGIN_BOTTOM = 100
 MARGIN_TITLE = 100
 DIMENSIONS_TEXT_OFFSET = 12
 FACE_ANNOTATION_OFFSET = 5
+LABEL_HALO_WIDTH = 8
+LOD_MIN_FEATURE_SIZE = 3
 CLOSE_UP_PADDING = 32
+CLOSE_UP_MIN_HEIGHT = 200  # keeps the close-up and its dimensions readable next to long full views
 DRILL_ANNOTATION_OFFSET_Y = 2
 ANNOTATION_DIMENSION_X_OFFSET_OFFSET = 15
\ No newline at end of file
@@ -0,0 +1,249 @@
+import heapq
+import math
+from bisect import bisect_left
+from dataclasses import dataclass
+from typing import Hashable, Iterable
+
+import drawsvg as draw
+
+from .layout_base import SizedGroup, ViewBox
+from .spatial import GridIndex
+from .steps.base import Marker, Step
+from .steps.bodies import Body, ModifyBodyStep, ModifyMultiBodyStep
+from .style import DASH
+from .utils import PathBatch
+
+HISTORY_BATCH_SIZE = 16  # steps per history segment whose batched lines and rectangles are drawn as one path
+
+
+@dataclass(frozen=True)
+class Segment:
+    """Consecutive steps of a cached history and their drawing.
+
+    `core` draws the steps except for the lines and rectangles collected in `batch`, so that a merged segment can
+    draw the batches of all its steps as one path per style. `group` draws the segment. `markers` replace simplified
+    steps.
+    """
+    size: int
+    core: draw.Group | None
+    batch: PathBatch
+    markers: dict[Hashable, Marker]
+    group: draw.Group | None
+
+    @classmethod
+    def create(
+            cls,
+            size: int,
+            core: draw.Group | None,
+            batch: PathBatch,
+            markers: dict[Hashable, Marker],
+    ) -> 'Segment':
+        if not len(batch):
+            group = core
+        else:
+            group = draw.Group()
+            if core is not None:
+                group.append(draw.Use(core, 0, 0))
+            batch.draw(group)
+        return cls(size, core, batch, markers, group)
+
+
+class StepIndex:
+    """Index from bodies to the ordered steps modifying them.
+
+    The history of a step consists of all earlier steps that modify at least one of its bodies. Besides the step
+    indices per body, the running union of the steps' view boxes is kept, so that the view box covering a step and
+    its history is available without combining the whole history again. A grid over the steps' footprints per body
+    allows looking up only the history steps drawn within a given region.
+    """
+
+    def __init__(self, steps: list[Step]) -> None:
+        self.steps = steps
+        self._body_steps: dict[Body, list[int]] = {}
+        self._body_view_boxes: dict[Body, ViewBox] = {}
+        self._body_grids: dict[Body, GridIndex] = {}
+        self._keys: list[frozenset[Body]] = []
+        self._view_boxes: list[ViewBox] = []
+
+        for step_idx, step in enumerate(steps):
+            self._add(step_idx, step)
+
+    @staticmethod
+    def get_bodies(step: Step) -> list[Body]:
+        if isinstance(step, ModifyBodyStep):
+            return [step.body]
+        if isinstance(step, ModifyMultiBodyStep):
+            return list(dict.fromkeys(step.bodies))
+        return []
+
+    def get_key(self, step_idx: int) -> frozenset[Body]:
+        return self._keys[step_idx]
+
+    def get_view_box(self, step_idx: int) -> ViewBox:
+        return self._view_boxes[step_idx]
+
+    def get_history(self, step_idx: int, start: int = 0, view_box: ViewBox | None = None) -> list[Step]:
+        """Return the history of step `step_idx`, omitting steps before index `start`.
+
+        If `view_box` is given, only steps whose footprint intersects it are returned.
+        """
+        indices = []
+        for body in self._keys[step_idx]:
+            if view_box is not None:
+                indices.append([
+                    idx for idx in self._body_grids[body].query(view_box)
+                    if start <= idx < step_idx
+                ])
+            else:
+                body_steps = self._body_steps[body]
+                indices.append(body_steps[bisect_left(body_steps, start):bisect_left(body_steps, step_idx)])
+
+        if len(indices) == 1:
+            return [self.steps[idx] for idx in indices[0]]
+
+        history = []
+        prev_idx = None
+        for idx in heapq.merge(*indices):
+            if idx != prev_idx:
+                history.append(self.steps[idx])
+            prev_idx = idx
+        return history
+
+    def _add(self, step_idx: int, step: Step) -> None:
+        bodies = self.get_bodies(step)
+        view_boxes = [step.view_box]
+        for body in bodies:
+            self._body_steps.setdefault(body, []).append(step_idx)
+            self._body_grids.setdefault(body, GridIndex()).insert(step_idx, step.view_box_footprint)
+            if body in self._body_view_boxes:
+                self._body_view_boxes[body] = ViewBox.combine([self._body_view_boxes[body], step.view_box])
+            else:
+                self._body_view_boxes[body] = step.view_box
+            view_boxes.append(self._body_view_boxes[body])
+
+        self._keys.append(frozenset(bodies))
+        self._view_boxes.append(ViewBox.combine(view_boxes))
+
+
+class HistoryCache:
+    """Caches the inactive drawing of step histories.
+
+    Every step is drawn once into its own group. For every set of bodies the drawn history is kept as a list of
+    segments whose sizes are decreasing powers of two, merging equally sized segments like a binary counter. A later
+    history of the same bodies only adds the steps added since, and a history group references O(log n) segments
+    nested at most O(log n) levels deep.
+
+    The lines and rectangles steps batch (e.g. the projections of holes onto the other faces of a bar) are drawn as
+    one path per style for all steps of a segment of `HISTORY_BATCH_SIZE` steps. Smaller segments reference the
+    groups of their steps and larger ones those of their segments, so every line is drawn by about two paths.
+
+    Histories can be simplified for views drawn at a small scale: steps whose features are smaller than `min_size`
+    are replaced by markers, and markers falling into the same cell of a grid of that size are merged. `min_size` is
+    rounded down to a power of two, so views of similar scale share their cached segments.
+    """
+
+    def __init__(self, index: StepIndex) -> None:
+        self.index = index
+        self._step_segments: dict[int, Segment] = {}
+        self._entries: dict[tuple[frozenset[Body], float | None], tuple[int, list[Segment]]] = {}
+
+    def get_group(
+            self,
+            step_idx: int,
+            view_box: ViewBox | None = None,
+            min_size: float | None = None,
+    ) -> draw.Group | None:
+        """Return a group showing the history of step `step_idx`.
+
+        If `view_box` is given, the group only shows the history steps intersecting it and is not cached. If
+        `min_size` is given, features smaller than it are simplified.
+        """
+        if view_box is not None:
+            steps = self.index.get_history(step_idx, view_box=view_box)
+            return self._get_uses_group([self._get_step_segment(step, None).group for step in steps])
+
+        lod = 2 ** math.floor(math.log2(min_size)) if min_size else None
+        key = (self.index.get_key(step_idx), lod)
+        end, segments = self._entries.get(key, (0, []))
+        if end > step_idx:
+            end, segments = 0, []
+
+        for step in self.index.get_history(step_idx, start=end):
+            segments.append(self._get_step_segment(step, lod))
+            while len(segments) > 1 and segments[-1].size == segments[-2].size:
+                segments[-2:] = [self._merge_segments(segments[-2:])]
+
+        self._entries[key] = (step_idx, segments)
+
+        groups = [segment.group for segment in segments if segment.group is not None]
+        markers = {}
+        for segment in segments:
+            markers.update(segment.markers)
+        if markers:
+            groups.append(self._get_markers_group(markers.values(), lod))
+        if len(groups) == 1:
+            return groups[0]
+        return self._get_uses_group(groups)
+
+    def _get_step_segment(self, step: Step, lod: float | None) -> Segment:
+        markers = step.get_lod_markers(lod) if lod is not None else None
+        if markers is not None:
+            return Segment.create(1, None, PathBatch(), {self._get_marker_key(marker, lod): marker for marker in markers})
+
+        segment = self._step_segments.get(id(step))
+        if segment is None:
+            # texts registered by inactive steps (face annotations) are dropped, the active step registers the same ones
+            step_group = SizedGroup(batch=PathBatch())
+            step.draw(step_group, active=False, dimensions=False)
+            segment = self._step_segments[id(step)] = Segment.create(1, step_group, step_group.batch, {})
+        return segment
+
+    def _merge_segments(self, segments: list[Segment], draw_batch: bool = False) -> Segment:
+        """Merge consecutive segments. With `draw_batch`, their batches are drawn as one path per style."""
+        size = sum(segment.size for segment in segments)
+        markers = {}
+        for segment in segments:
+            markers.update(segment.markers)
+        groups = [segment.group for segment in segments if segment.group is not None]
+        if segments[0].size >= HISTORY_BATCH_SIZE:
+            # the batches of the segments are drawn already
+            return Segment(size, None, PathBatch(), markers, self._get_uses_group(groups))
+
+        cores = [segment.core for segment in segments if segment.core is not None]
+        core = cores[0] if len(cores) == 1 else self._get_uses_group(cores)
+        batch = PathBatch()
+        for segment in segments:
+            batch.update(segment.batch)
+        if draw_batch or size >= HISTORY_BATCH_SIZE:
+            return Segment.create(size, core, batch, markers)
+        return Segment(size, core, batch, markers, self._get_uses_group(groups))
+
+    @staticmethod
+    def _get_marker_key(marker: Marker, lod: float) -> Hashable:
+        if marker[0] == 'use':
+            return 'use', id(marker[1]), marker[2], marker[3]
+        return marker[0], *(round(value / lod) for value in marker[1:])
+
+    @staticmethod
+    def _get_markers_group(markers: Iterable[Marker], lod: float) -> draw.Group:
+        group = draw.Group()
+        batch = PathBatch()
+        for marker in markers:
+            if marker[0] == 'use':
+                group.append(draw.Use(marker[1], marker[2], marker[3]))
+            elif marker[0] == 'dot':
+                batch.add_rectangle(marker[1] - lod / 2, marker[2] - lod / 2, lod, lod, stroke='none', fill='black')
+            else:
+                batch.add_line(*marker[1:], stroke='gray', stroke_opacity=1, stroke_dasharray=DASH, fill='none')
+        batch.draw(group)
+        return group
+
+    @staticmethod
+    def _get_uses_group(groups: list[draw.Group]) -> draw.Group | None:
+        if not groups:
+            return None
+
+        uses_group = draw.Group()
+        for group in groups:
+            uses_group.append(draw.Use(group, 0, 0))
+        return uses_group
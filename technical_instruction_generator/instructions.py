@@ -1,111 +1,520 @@
+import asyncio
+import math
 import os
-import subprocess
-import time
+import threading
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor, ThreadPoolExecutor, as_completed
 from pathlib import Path
+from typing import Iterable, Iterator
 
 import drawsvg as draw
-from lxml import etree
-from PyPDF2 import PdfMerger
 from tqdm import tqdm
 
-from .layout_base import Alignment, ExpandBehaviour, LayoutDirection, ScaleBehaviour, SizedGroup
+from .cache import RenderCache, get_source_key, get_step_keys, make_key
+from .context import RenderContext
+from .converters import ConversionReport, Converter, get_converter
+from .history import StepIndex
+from .labels import get_text_width
+from .layout_base import Alignment, FixedSizeBehaviour, LabelMode, LayoutDirection, ScaleBehaviour, SizeBehaviour, SizedGroup
 from .layout import  LinearLayout, Page
-from .steps.bodies import ModifyBodyStep, ModifyMultiBodyStep
+from .merge import PdfStreamMerger, linearize_pdf
+from .pdf import PdfDocument
 from .steps.views import CloseUpView, FullView
-from .style import FONT_FAMILY_TEXT, INSTRUCTION_BOX_STROKE_COLOR
+from .style import FONT_FAMILY_TEXT
 from .dimensions import (
+    A4_WIDTH,
+    CLOSE_UP_MIN_HEIGHT,
     CLOSE_UP_PADDING, FONT_SIZE_BASE,
     HEADER_TEXT_OFFSET_X,
     HEADER_SIZE,
+    INSTRUCTION_BOX_HEIGHT,
     INSTRUCTION_BOX_PADDING,
+    LOD_MIN_FEATURE_SIZE,
+    MARGIN_LEFT,
+    MARGIN_RIGHT,
+    STEP_LAYOUT_PADDING,
 )
 from .steps.base import Step
+from .symbols import get_box_frame
+from .writers import LxmlWriter, PageWriter
+
+PAGE_RANGES_PER_JOB = 4
 
 
 class Instructions:
-    def __init__(self, steps: list[Step], title: str | None = None) -> None:
+    def __init__(
+            self,
+            steps: list[Step],
+            title: str | None = None,
+            label_mode: LabelMode = LabelMode.BACKGROUND,
+            resolve_label_overlaps: bool = True,
+            level_of_detail: bool = True,
+    ) -> None:
         self.steps = steps
         self.title = title
+        self.label_mode = label_mode
+        self.resolve_label_overlaps = resolve_label_overlaps
+        self.level_of_detail = level_of_detail
+
+    def save_svgs(
+            self,
+            path: str | Path | os.PathLike,
+            max_pages_in_memory: int = 2,
+            writer: PageWriter | None = None,
+            jobs: int = 1,
+            cache: RenderCache | None = None,
+    ) -> None:
+        """Render the pages and save them as `<stem>_<page nr>.svg` next to `path`.
+
+        Pages are written in the background by `writer` (`LxmlWriter` by default) while the next page is rendered. At
+        most `max_pages_in_memory` pages are held at once (the page being rendered and those still being written). The
+        drawings of the step histories shared by the pages (see `HistoryCache`) are kept for the whole document, so
+        memory still grows with the number of steps, but not by whole pages.
 
-        self._etree_parser = etree.XMLParser(remove_comments=True, recover=True, resolve_entities=False)
+        With `jobs` > 1, the pages are planned first and contiguous ranges of pages are rendered and written by a pool
+        of `jobs` processes, each holding at most `max_pages_in_memory` pages.
 
-    def save_svgs(self, path: str | Path | os.PathLike) -> None:
+        With a `cache`, pages whose steps, histories and options did not change since they were cached are copied from
+        it instead of being rendered.
+        """
         if not isinstance(path, Path):
             path = Path(path)
+        if max_pages_in_memory < 1:
+            raise ValueError("`max_pages_in_memory` must be at least 1")
+        if jobs < 1:
+            raise ValueError("`jobs` must be at least 1")
+
+        if writer is None:
+            writer = LxmlWriter()
 
         path.parent.mkdir(exist_ok=True)
 
-        for idx, page in enumerate(self._generate_svgs()):
-            page.drawing.save_svg(path.parent / f"{path.stem}_{idx + 1:03d}.svg")
+        context = self.create_render_context()
+        page_plan = self.plan(context)
+        page_keys = self._get_page_keys(context, page_plan, writer.key) if cache is not None else None
+
+        if jobs == 1:
+            with tqdm(total=len(self.steps), desc="generating SVGs") as progress:
+                self._save_pages(
+                    path, context, page_plan, range(len(page_plan)), writer, max_pages_in_memory, cache, page_keys,
+                    progress,
+                )
+            return
+
+        # more ranges than processes, as ranges with long histories take longer to render
+        page_ranges = split_page_plan(page_plan, PAGE_RANGES_PER_JOB * jobs)
+        with (
+            ProcessPoolExecutor(max_workers=jobs) as executor,
+            tqdm(total=len(self.steps), desc="generating SVGs") as progress,
+        ):
+            futures = [
+                executor.submit(
+                    _save_page_range, self, page_plan, page_range, path, writer, max_pages_in_memory, cache, page_keys
+                )
+                for page_range in page_ranges
+            ]
+            for future in as_completed(futures):
+                progress.update(future.result())
+
+    def save_pdf(
+            self,
+            path: str | Path | os.PathLike,
+            jobs: int | None = None,
+            converter: Converter | str | None = None,
+            report: bool = False,
+            linearize: bool = False,
+            cache: RenderCache | None = None,
+    ) -> None:
+        """Render the pages, convert them to PDF and merge them into `path`. See `save_pdf_async`.
+
+        If `report` is set, the conversion time of every page is printed.
+        """
+        conversion_report = asyncio.run(
+            self.save_pdf_async(path, jobs=jobs, converter=converter, linearize=linearize, cache=cache)
+        )
+        if report:
+            print(conversion_report)
 
-    def save_pdf(self, path: str | Path | os.PathLike) -> None:
+    def save_pdf_direct(self, path: str | Path | os.PathLike, linearize: bool = False) -> None:
+        """Render the pages straight into the PDF `path` with `PdfDocument`, without SVGs and a converter.
+
+        Text is set in the standard PDF fonts instead of the fonts of the SVGs. See `linearize_pdf` for `linearize`.
+        The PDF is written to a temporary file next to `path`, which replaces `path` once it is complete.
+        """
         if not isinstance(path, Path):
             path = Path(path)
+        path.parent.mkdir(exist_ok=True)
 
-        self.save_svgs(path)
-
-        # generate PDFs
-        svg_paths = sorted(path.parent.rglob(f"{path.stem}_*.svg"))
-        for svg_path in tqdm(svg_paths, 'generating tmp pdfs'):
-            pdf_path = str(svg_path).replace(".svg", ".pdf")
-            subprocess.call([
-                'C:/Program Files/Inkscape/inkscape.exe',
-                f'--file={svg_path}',
-                '--export-area-drawing',
-                '--without-gui',
-                f'--export-pdf={pdf_path}',
-            ])
-
-        # merge PDFs
-        merger = PdfMerger()
-        pdf_paths = sorted(path.parent.rglob(f"{path.stem}_*.pdf"))
-        for pdf in tqdm(pdf_paths, 'mergings pdfs'):
-            merger.append(pdf)
-        print("writing final pdf..", end=" ", flush=True)
-        merger.write(path)
-        merger.close()
-        print("done.")
-
-        # cleanup
-        time.sleep(1)
-        for path in tqdm(svg_paths, 'deleting tmp svgs'):
-            path.unlink()
-        for pdf_path in tqdm(pdf_paths, 'deleting tmp pdfs'):
-            pdf_path.unlink()
-
-    def _generate_svgs(self) -> list[Page]:
-        pages: list[Page] = []
+        tmp_path = path.with_name(f".{path.name}.{os.getpid()}.tmp")
+        try:
+            with open(tmp_path, 'wb') as file, PdfDocument(file) as pdf:
+                for _, page in self._generate_svgs():
+                    pdf.add_page(page.drawing)
+            if linearize:
+                linearize_pdf(tmp_path)
+            os.replace(tmp_path, path)
+        except BaseException:
+            tmp_path.unlink(missing_ok=True)
+            raise
 
-        # compile SVGs
-        page_idx = 0
-        page = Page(page_idx, self.title)
-        for step_idx in tqdm(range(len(self.steps)), desc="generating SVGs"):
-            if not self._add_step(page, step_idx):
-                pages.append(page)
-                page_idx += 1
-                page = Page(page_idx)
-                if not self._add_step(page, step_idx):
-                    raise ValueError(f"Unable to add step {step_idx} `{self.steps[step_idx].get_instruction()}` to new page!")
+    async def save_pdf_async(
+            self,
+            path: str | Path | os.PathLike,
+            jobs: int | None = None,
+            converter: Converter | str | None = None,
+            max_pending_pages: int = 8,
+            linearize: bool = False,
+            cache: RenderCache | None = None,
+    ) -> ConversionReport:
+        """Render the pages, convert them to PDF and merge them into `path`.
+
+        The three stages overlap: a page is converted as soon as it is rendered, and appended to the merged PDF as
+        soon as it and all pages before it are converted. Up to `jobs` conversions run at once (the number of CPUs by
+        default) and at most `max_pending_pages` rendered pages wait for conversion, so rendering pauses while the
+        converters are behind. This bounds the pages in flight, not the cached history drawings shared by the pages,
+        which grow with the number of steps. The pages are passed between the stages as bytes, without intermediate
+        files.
+
+        `converter` is a `Converter` or the name of one; by default the first available one is used. With
+        `linearize`, the merged PDF is rewritten for fast web view by `linearize_pdf`. With a `cache`, the PDFs of pages
+        that did not change since they were cached are merged as they are, without rendering and converting them.
+        Returns the conversion time of every converted page.
+        """
+        if not isinstance(path, Path):
+            path = Path(path)
+        if jobs is None:
+            jobs = os.cpu_count() or 1
+        if not isinstance(converter, Converter):
+            converter = get_converter(converter)
+        conversion_report = ConversionReport(converter.name)
+
+        path.parent.mkdir(exist_ok=True)
+
+        context = self.create_render_context()
+        page_plan = await asyncio.to_thread(self.plan, context)
+        page_keys = None
+        if cache is not None:
+            page_keys = await asyncio.to_thread(
+                self._get_page_keys, context, page_plan, f"{LxmlWriter().key} {converter.key}"
+            )
+
+        loop = asyncio.get_running_loop()
+        svg_queue: asyncio.Queue[tuple[int, bytes] | None] = asyncio.Queue(max_pending_pages)
+        pdf_queue: asyncio.Queue[tuple[int, bytes] | None] = asyncio.Queue()
+
+        stop_rendering = threading.Event()
+        rendering = loop.run_in_executor(
+            None,
+            self._render_pages_to_queue,
+            context, page_plan, svg_queue, pdf_queue, loop, stop_rendering, cache, page_keys,
+        )
+
+        async def render() -> None:
+            # shielded, as cancelling cannot stop the thread, it is stopped by `stop_rendering` below
+            await asyncio.shield(rendering)
+            for _ in range(jobs):
+                await svg_queue.put(None)
+
+        async def convert() -> None:
+            await asyncio.gather(*(
+                self._convert_pages(converter, conversion_report, svg_queue, pdf_queue, cache, page_keys)
+                for _ in range(jobs)
+            ))
+            await pdf_queue.put(None)
+
+        tasks = [asyncio.create_task(stage) for stage in (render(), convert(), self._merge_pages(path, pdf_queue))]
+        try:
+            await asyncio.gather(*tasks)
+        except BaseException:
+            for task in tasks:
+                task.cancel()
+            # the thread may be waiting for room in `svg_queue`, which no converter takes pages from anymore
+            stop_rendering.set()
+            while not svg_queue.empty():
+                svg_queue.get_nowait()
+            # the merger removes its partial file before the error is passed on
+            await asyncio.wait([rendering, *tasks])
+            raise
+        finally:
+            await converter.close()
+
+        if linearize:
+            await asyncio.to_thread(linearize_pdf, path)
+        return conversion_report
+
+    def _render_pages_to_queue(
+            self,
+            context: RenderContext,
+            page_plan: list[list[int]],
+            svg_queue: asyncio.Queue,
+            pdf_queue: asyncio.Queue,
+            loop: asyncio.AbstractEventLoop,
+            stop: threading.Event,
+            cache: RenderCache | None = None,
+            page_keys: list[str] | None = None,
+    ) -> None:
+        """Render the pages in a worker thread, passing their SVG bytes on to the event loop's `svg_queue`.
+
+        The PDFs of pages found in `cache` are passed on to `pdf_queue` instead. Returns early once `stop` is set.
+        """
+        writer = LxmlWriter()
+        with tqdm(total=len(self.steps), desc="generating SVGs") as progress:
+            def get_uncached_page_idxs() -> Iterator[int]:
+                for page_idx in range(len(page_plan)):
+                    if stop.is_set():
+                        return
+                    pdf = cache.get(page_keys[page_idx], ".pdf") if cache is not None else None
+                    if pdf is None:
+                        yield page_idx
+                        continue
+                    asyncio.run_coroutine_threadsafe(pdf_queue.put((page_idx, pdf)), loop).result()
+                    progress.update(len(page_plan[page_idx]))
+
+            for page_idx, page in self._generate_pages(context, page_plan, get_uncached_page_idxs(), progress):
+                svg = writer.to_bytes(page.drawing)
+                del page
+                if stop.is_set():
+                    return
+                asyncio.run_coroutine_threadsafe(svg_queue.put((page_idx, svg)), loop).result()
+
+    @staticmethod
+    async def _convert_pages(
+            converter: Converter,
+            conversion_report: ConversionReport,
+            svg_queue: asyncio.Queue,
+            pdf_queue: asyncio.Queue,
+            cache: RenderCache | None = None,
+            page_keys: list[str] | None = None,
+    ) -> None:
+        while (item := await svg_queue.get()) is not None:
+            page_idx, svg = item
+            pdf = await conversion_report.convert(converter, page_idx, svg)
+            if cache is not None:
+                await asyncio.to_thread(cache.put, page_keys[page_idx], ".pdf", pdf)
+            await pdf_queue.put((page_idx, pdf))
+
+    @staticmethod
+    async def _merge_pages(path: Path, pdf_queue: asyncio.Queue) -> None:
+        loop = asyncio.get_running_loop()
+        merger = PdfStreamMerger(path)
+        # the merger is only used from this thread, so aborting waits for a running append to finish
+        executor = ThreadPoolExecutor(max_workers=1)
+        try:
+            pending: dict[int, bytes] = {}
+            next_page_idx = 0
+            while (item := await pdf_queue.get()) is not None:
+                pending[item[0]] = item[1]
+                while next_page_idx in pending:
+                    await loop.run_in_executor(executor, merger.append, pending.pop(next_page_idx))
+                    next_page_idx += 1
+
+            if pending:
+                raise RuntimeError(f"Page {next_page_idx + 1} was not converted")
+            await loop.run_in_executor(executor, merger.close)
+        except BaseException:
+            # shielded, so that the partial file is removed before returning even if cancelled again
+            await asyncio.shield(loop.run_in_executor(executor, merger.abort))
+            raise
+        finally:
+            executor.shutdown(wait=False)
+
+    def create_render_context(self) -> RenderContext:
+        """Create the state of one rendering of the current steps and options."""
+        return RenderContext(
+            StepIndex(self.steps),
+            label_mode=self.label_mode,
+            resolve_label_overlaps=self.resolve_label_overlaps,
+            level_of_detail=self.level_of_detail,
+        )
+
+    def plan(self, context: RenderContext | None = None) -> list[list[int]]:
+        """Assign the steps to pages without drawing anything.
 
-        pages.append(page)
+        Returns the indices of the steps on each page. Raises a `ValueError` if a step does not fit on an empty page.
+        """
+        if context is None:
+            context = self.create_render_context()
+
+        pages: list[list[int]] = [[]]
+        layout = Page.create_layout(self.title)
+        for step_idx in range(len(self.steps)):
+            size, size_behaviour = self._measure_step(context, step_idx)
+            if layout.reserve(size, size_behaviour) is None:
+                pages.append([])
+                layout = Page.create_layout()
+                if layout.reserve(size, size_behaviour) is None:
+                    raise ValueError(f"Unable to add step {step_idx} `{self.steps[step_idx].get_instruction()}` to new page!")
+            pages[-1].append(step_idx)
 
         return pages
 
-    def _add_step(self, page: Page, step_idx: int) -> bool:
+    def _generate_svgs(self) -> Iterator[tuple[int, Page]]:
+        context = self.create_render_context()
+        page_plan = self.plan(context)
+
+        # compile SVGs
+        with tqdm(total=len(self.steps), desc="generating SVGs") as progress:
+            yield from self._generate_pages(context, page_plan, range(len(page_plan)), progress)
+
+    def _generate_pages(
+            self,
+            context: RenderContext,
+            page_plan: list[list[int]],
+            page_idxs: Iterable[int],
+            progress: tqdm | None = None,
+    ) -> Iterator[tuple[int, Page]]:
+        for page_idx in page_idxs:
+            page = Page(page_idx, self.title if page_idx == 0 else None)
+            for step_idx in page_plan[page_idx]:
+                if not self._add_step(context, page, step_idx):
+                    raise RuntimeError(f"Step {step_idx} does not fit on page {page_idx + 1} as planned!")
+                if progress is not None:
+                    progress.update()
+            yield page_idx, page
+
+    def _get_page_keys(self, context: RenderContext, page_plan: list[list[int]], output_key: str) -> list[str]:
+        """Return the `RenderCache` key of each page, `output_key` identifies the writer or converter of the pages."""
+        step_keys = get_step_keys(self.steps)
+        options = (context.label_mode, context.resolve_label_overlaps, context.level_of_detail)
+        return [
+            make_key(
+                get_source_key(),
+                output_key,
+                options,
+                page_idx,
+                self.title if page_idx == 0 else None,
+                [step_keys[step_idx] for step_idx in step_idxs],
+            )
+            for page_idx, step_idxs in enumerate(page_plan)
+        ]
+
+    def _save_pages(
+            self,
+            path: Path,
+            context: RenderContext,
+            page_plan: list[list[int]],
+            page_idxs: range,
+            writer: PageWriter,
+            max_pages_in_memory: int,
+            cache: RenderCache | None = None,
+            page_keys: list[str] | None = None,
+            progress: tqdm | None = None,
+    ) -> None:
+        """Save the pages `page_idxs`, copying those found in `cache` and rendering the others."""
+        def get_uncached_page_idxs() -> Iterator[int]:
+            for page_idx in page_idxs:
+                svg = cache.get(page_keys[page_idx], writer.suffix) if cache is not None else None
+                if svg is None:
+                    yield page_idx
+                    continue
+                get_page_path(path, page_idx, writer).write_bytes(svg)
+                if progress is not None:
+                    progress.update(len(page_plan[page_idx]))
+
+        pages = self._generate_pages(context, page_plan, get_uncached_page_idxs(), progress)
+        self._write_pages(path, pages, writer, max_pages_in_memory, cache, page_keys)
+
+    @staticmethod
+    def _write_pages(
+            path: Path,
+            pages: Iterator[tuple[int, Page]],
+            writer: PageWriter,
+            max_pages_in_memory: int,
+            cache: RenderCache | None = None,
+            page_keys: list[str] | None = None,
+    ) -> None:
+        with ThreadPoolExecutor(max_workers=1) as executor:
+            pending: deque[Future] = deque()
+            for page_idx, page in pages:
+                page_path = get_page_path(path, page_idx, writer)
+                if cache is None:
+                    pending.append(executor.submit(writer.write, page.drawing, page_path))
+                else:
+                    pending.append(executor.submit(
+                        _write_cached_page, page.drawing, page_path, writer, cache, page_keys[page_idx]
+                    ))
+                del page
+                while len(pending) >= max_pages_in_memory:
+                    pending.popleft().result()
+            while pending:
+                pending.popleft().result()
+
+    def _measure_step(self, context: RenderContext, step_idx: int) -> tuple[tuple[int | None, int | None], SizeBehaviour]:
+        """Return the size of the box of step `step_idx` and how it is fit into the page layout.
+
+        The box is only as high as its views need. If the views are drawn at the same scale in a box of half the page
+        width and the header fits, the box takes half the page width, so that two boxes share a row.
+        """
+        step = self.steps[step_idx]
+        view_box = context.step_index.get_view_box(step_idx)
+        view_sizes = [
+            CloseUpView([step], padding=(CLOSE_UP_PADDING, 0)).size,
+            (view_box.width, view_box.height),
+        ]
+
+        width = A4_WIDTH - MARGIN_LEFT - MARGIN_RIGHT
+        scales, height = self._fit_views(view_sizes, width)
+
+        half_width = (width - INSTRUCTION_BOX_PADDING) // 2
+        half_scales, half_height = self._fit_views(view_sizes, half_width)
+        if (
+            scales
+            and len(half_scales) == len(scales)
+            and all(math.isclose(scale, half_scale) for scale, half_scale in zip(scales, half_scales))
+            and self._get_header_width(step_idx) <= half_width
+        ):
+            width, height = half_width, half_height
+
+        return (width, height), FixedSizeBehaviour()
+
+    def _fit_views(self, view_sizes: list[tuple[int, int]], width: int) -> tuple[list[float], int]:
+        """Return the scales of views laid out next to each other in a box of the given width and the box height.
+
+        The layout is as high as the views need to fill the width together, but at least `CLOSE_UP_MIN_HEIGHT`. The
+        first view (the close-up) is scaled to the layout height, the others are scaled independently to fit the
+        remaining width, so a long full view does not shrink the close-up.
+        """
+        layout_width = width - 2 * INSTRUCTION_BOX_PADDING
+        max_height = INSTRUCTION_BOX_HEIGHT - HEADER_SIZE - 2 * INSTRUCTION_BOX_PADDING
+        fill_height = (layout_width - STEP_LAYOUT_PADDING * (len(view_sizes) - 1)) / sum(w / h for w, h in view_sizes)
+        step_layout = LinearLayout(
+            width=layout_width,
+            height=min(max(math.floor(fill_height), CLOSE_UP_MIN_HEIGHT), max_height),
+            direction=LayoutDirection.HORIZONTAL,
+            padding=STEP_LAYOUT_PADDING,
+        )
+        scales = []
+        height = 0
+        for view_size in view_sizes:
+            placement = step_layout.reserve(view_size, ScaleBehaviour())
+            if placement is None:
+                return [], INSTRUCTION_BOX_HEIGHT
+            scale = placement[2][1]
+            scales.append(scale)
+            height = max(height, min(math.ceil(view_size[1] * scale), step_layout.height))
+        return scales, HEADER_SIZE + 2 * INSTRUCTION_BOX_PADDING + height
+
+    def _get_header_width(self, step_idx: int) -> float:
         step = self.steps[step_idx]
-        steps = self.steps[:(step_idx + 1)]
         step_id = step.identifier or f"{step_idx + 1}"
+        return (
+            2 * HEADER_TEXT_OFFSET_X + 5
+            + get_text_width(f"Schritt {step_id}:", FONT_SIZE_BASE, FONT_FAMILY_TEXT, bold=True)
+            + get_text_width(step.get_instruction(), FONT_SIZE_BASE, FONT_FAMILY_TEXT)
+        )
 
-        box = SizedGroup(width=None, height=400)
-        size_behaviour = ExpandBehaviour(direction=LayoutDirection.HORIZONTAL, keep_aspect_ratio=False)
+    def _add_step(self, context: RenderContext, page: Page, step_idx: int) -> bool:
+        step = self.steps[step_idx]
+        step_id = step.identifier or f"{step_idx + 1}"
+
+        size, size_behaviour = self._measure_step(context, step_idx)
+        box = SizedGroup(width=size[0], height=size[1])
         if not page.layout.add_group(box, size_behaviour):
             return False
 
-        box.append(draw.Rectangle(0, 0, box.width, box.height, fill='white', stroke=INSTRUCTION_BOX_STROKE_COLOR,
-                                    stroke_width=2, rx='5', ry='5'))
+        box.append(draw.Use(get_box_frame(box.width, box.height), 0, 0))
 
         # add instructions
-        box.append(draw.Line(0, HEADER_SIZE, box.width, HEADER_SIZE, stroke=INSTRUCTION_BOX_STROKE_COLOR))
         text = draw.Text(
             f"Schritt {step_id}:",
             FONT_SIZE_BASE,
@@ -128,30 +537,67 @@ class Instructions:
             height=height,
             alignment=Alignment.CENTER,
             direction=LayoutDirection.HORIZONTAL,
-            padding=32,
+            padding=STEP_LAYOUT_PADDING,
+            label_mode=context.label_mode,
+            resolve_label_overlaps=context.resolve_label_overlaps,
+            transform=f"translate({x},{y})",
         )
-        box.append(draw.Use(step_layout, x, y))
+        box.append(step_layout)
 
         # add step views
-        if isinstance(step, ModifyBodyStep):
-            steps = [
-                step_ for step_ in steps
-                if (isinstance(step_, ModifyBodyStep) and step_.body == step.body)
-                or (isinstance(step_, ModifyMultiBodyStep) and step in step_.bodies)
-            ]
-            for step_ in steps[:-1]:
-                step.set_active_body(step_.body)
-        elif isinstance(step, ModifyMultiBodyStep):
-            steps = [
-                step_ for step_ in steps
-                if (isinstance(step_, ModifyBodyStep) and step_.body in step.bodies)
-                or (isinstance(step_, ModifyMultiBodyStep) and step.get_common_bodies(step_))
-            ]
-            for step_ in steps[:-1]:
-                step_.set_active_bodies(step.bodies)
-        else:
-            steps = [step]
-        step_layout.add_view(CloseUpView(steps, padding=(CLOSE_UP_PADDING, 0)), size_behaviour=ScaleBehaviour())
-        step_layout.add_view(FullView(steps), size_behaviour=ScaleBehaviour())
+        # history steps are drawn once and referenced by both views, the close-up only shows those it intersects
+        close_up_view = CloseUpView([step], padding=(CLOSE_UP_PADDING, 0))
+        close_up_view.history = context.history_cache.get_group(step_idx, view_box=close_up_view.visible_box)
+        if not step_layout.add_view(close_up_view, size_behaviour=ScaleBehaviour()):
+            raise RuntimeError(f"The close-up of step {step_idx} does not fit into its box!")
+
+        # the full view is placed first, so that history features too small to be seen at its scale are simplified
+        full_view = FullView([step], view_box=context.step_index.get_view_box(step_idx))
+        placement = step_layout.reserve(full_view.size, ScaleBehaviour())
+        if placement is None:
+            raise RuntimeError(f"The full view of step {step_idx} does not fit into its box!")
+        min_size = LOD_MIN_FEATURE_SIZE / placement[2][0] if context.level_of_detail else None
+        full_view.history = context.history_cache.get_group(step_idx, min_size=min_size)
+        step_layout.place_view(full_view, placement)
 
         return True
+
+
+def split_page_plan(page_plan: list[list[int]], n_ranges: int) -> list[range]:
+    """Split the pages into at most `n_ranges` contiguous ranges with about the same number of steps."""
+    n_steps = sum(len(step_idxs) for step_idxs in page_plan)
+    ranges = []
+    start = 0
+    steps = 0
+    for page_idx, step_idxs in enumerate(page_plan):
+        steps += len(step_idxs)
+        if steps * n_ranges >= n_steps * (len(ranges) + 1) or page_idx == len(page_plan) - 1:
+            ranges.append(range(start, page_idx + 1))
+            start = page_idx + 1
+    return ranges
+
+
+def get_page_path(path: Path, page_idx: int, writer: PageWriter) -> Path:
+    return path.parent / f"{path.stem}_{page_idx + 1:03d}{writer.suffix}"
+
+
+def _write_cached_page(drawing: draw.Drawing, path: Path, writer: PageWriter, cache: RenderCache, key: str) -> None:
+    svg = writer.to_bytes(drawing)
+    cache.put(key, writer.suffix, svg)
+    path.write_bytes(svg)
+
+
+def _save_page_range(
+        instructions: Instructions,
+        page_plan: list[list[int]],
+        page_idxs: range,
+        path: Path,
+        writer: PageWriter,
+        max_pages_in_memory: int,
+        cache: RenderCache | None = None,
+        page_keys: list[str] | None = None,
+) -> int:
+    """Render (or copy from `cache`) and save a range of pages in a worker process, returning the number of steps."""
+    context = instructions.create_render_context()
+    instructions._save_pages(path, context, page_plan, page_idxs, writer, max_pages_in_memory, cache, page_keys)
+    return sum(len(page_plan[page_idx]) for page_idx in page_idxs)
@@ -0,0 +1,89 @@
+from functools import cache
+from xml.sax.saxutils import unescape
+
+import drawsvg as draw
+
+from .dimensions import FONT_SIZE_BASE
+from .layout_base import ViewBox
+from .spatial import GridIndex
+from .style import FONT_FAMILY_TECH, FONT_FAMILY_TEXT
+
+# advance widths in em, grouped by width (approximating the metrics of the fonts)
+ADVANCE_WIDTHS = {
+    FONT_FAMILY_TECH: {
+        0.333: " .,:;-!'|",
+        0.389: "()[]/\\",
+        0.5: "fijlrt\"",
+        0.667: "0123456789abcdeghknopqsuvxyz$#*+<=>?_~",
+        0.778: "ABCDEFGHIJKLNOPQRSTUVXYZw",
+        0.944: "Mm",
+        1.0: "W%@",
+        1.111: "&",
+    },
+    FONT_FAMILY_TEXT: {
+        0.241: " ",
+        0.27: ".,:;!'|",
+        0.31: "ijl",
+        0.37: "()[]-/\\ftr\"",
+        0.5: "acegsz",
+        0.56: "bdhknopquvxy",
+        0.6: "0123456789$#*+<=>?_~",
+        0.7: "ABCDEFGHIJKLNPRSTUVXYZ",
+        0.77: "OQ",
+        0.82: "mw&%@",
+        0.9: "MW",
+    },
+}
+DEFAULT_ADVANCE_WIDTH = 0.6
+BOLD_FACTOR = 1.1
+
+
+@cache
+def get_advance_widths(font_family: str) -> dict[str, float]:
+    """Return the advance width per character of a font in em."""
+    return {char: width for width, chars in ADVANCE_WIDTHS.get(font_family, {}).items() for char in chars}
+
+
+def get_text_width(text: str, font_size: float, font_family: str, bold: bool = False) -> float:
+    advance_widths = get_advance_widths(font_family)
+    width = sum(advance_widths.get(char, DEFAULT_ADVANCE_WIDTH) for char in text) * font_size
+    return width * BOLD_FACTOR if bold else width
+
+
+def get_label_width(text: draw.Text) -> float:
+    return get_text_width(
+        unescape(text.escaped_text),
+        text.args['font-size'],
+        text.args.get('font-family', FONT_FAMILY_TECH),
+        bold=text.args.get('font-weight') == 'bold',
+    )
+
+
+class LabelPlacer:
+    """Moves labels so they do not overlap labels placed before.
+
+    Placed labels are kept in a uniform grid, so testing a candidate position only looks at the labels in the grid
+    cells it touches. Every label tries its own position first and then positions shifted by multiples of its height
+    above and below; if all of them collide, the label stays where it is.
+    """
+
+    def __init__(self, max_shifts: int = 2, cell_size: float = 2 * FONT_SIZE_BASE) -> None:
+        self.max_shifts = max_shifts
+        self._grid = GridIndex(cell_size)
+
+    def place(self, text: draw.Text, bounds: tuple[float, float, float, float]) -> None:
+        """Place a label covering `bounds` (`(x, y, width, height)` at its current position), moving it if needed."""
+        x, y, width, height = bounds
+        for shift in self._get_shifts(height):
+            # the query box is inset slightly, so that labels touching each other do not collide
+            if not self._grid.query(ViewBox(x + 1, y + shift + 1, width - 2, height - 2)):
+                text.args['y'] += shift
+                self._grid.insert(text, ViewBox(x, y + shift, width, height))
+                return
+        self._grid.insert(text, ViewBox(x, y, width, height))
+
+    def _get_shifts(self, height: float) -> list[float]:
+        shifts = [0.0]
+        for i in range(1, self.max_shifts + 1):
+            shifts.extend([-i * height, i * height])
+        return shifts
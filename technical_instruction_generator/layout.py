@@ -1,53 +1,85 @@
+import copy
+
 import drawsvg as draw
 
 from .dimensions import A4_HEIGHT, A4_WIDTH, FONT_SIZE_BASE, FONT_SIZE_TITLE, \
-    INSTRUCTION_BOX_PADDING, MARGIN_BOTTOM, MARGIN_LEFT, MARGIN_RIGHT, MARGIN_TITLE, MARGIN_TOP
-from .layout_base import FixedSizeBehaviour, SizedGroup, SizeBehaviour, LayoutDirection, Alignment
+    INSTRUCTION_BOX_PADDING, LABEL_HALO_WIDTH, MARGIN_BOTTOM, MARGIN_LEFT, MARGIN_RIGHT, MARGIN_TITLE, MARGIN_TOP
+from .labels import LabelPlacer
+from .layout_base import FixedSizeBehaviour, SizedGroup, SizeBehaviour, LabelMode, LayoutDirection, Alignment
 from .steps.views import View
 from .style import FONT_FAMILY_TEXT
-from .utils import get_text_background
+from .symbols import get_page_background
+from .utils import PathBatch, get_text_background, get_text_bounds
+
+# position, size and scale of a group in a layout
+Placement = tuple[tuple[float, float], tuple[int, int], tuple[float, float]]
 
 
 class Page:
     def __init__(self, page_idx: int | None = None, title: str | None = None):
         self.drawing = draw.Drawing(A4_WIDTH, A4_HEIGHT, origin=(0, 0))
-        self.drawing.append(draw.Rectangle(0, 0, A4_WIDTH, A4_HEIGHT, fill='white'))
+        self.drawing.append(draw.Use(get_page_background(), 0, 0))
 
         if page_idx is not None:
             self.drawing.append(
                 draw.Text(f"{page_idx + 1}", FONT_SIZE_BASE, A4_WIDTH - 100, A4_HEIGHT - 100, text_anchor='end',
                           font_weight='bold', font_family=FONT_FAMILY_TEXT))
 
-        y = MARGIN_TOP
         if title is not None:
             self.drawing.append(draw.Text(title, FONT_SIZE_TITLE, A4_WIDTH / 2, MARGIN_TOP, text_anchor='middle',
                                   font_family=FONT_FAMILY_TEXT))
-            y += MARGIN_TITLE
 
-        self.layout = LinearLayout(id="layout", width=A4_WIDTH - MARGIN_LEFT - MARGIN_RIGHT,
-                              height=A4_HEIGHT - y - MARGIN_BOTTOM, direction=LayoutDirection.VERTICAL,
-                              padding=INSTRUCTION_BOX_PADDING)
-        self.drawing.append(draw.Use(self.layout, MARGIN_LEFT, y))
+        self.layout = self.create_layout(title)
+        self.drawing.append(self.layout)
 
+    @staticmethod
+    def get_layout_y(title: str | None = None) -> int:
+        return MARGIN_TOP + MARGIN_TITLE if title is not None else MARGIN_TOP
 
-class LinearLayout(SizedGroup):
-    def __init__(self, *args, direction: LayoutDirection, alignment: Alignment = None, padding: int = 0, **kwargs):
-        if alignment is None:
-            alignment = Alignment.CENTER
+    @classmethod
+    def create_layout(cls, title: str | None = None) -> 'GridLayout':
+        """Create the (empty) layout of a page, also used to measure pages without drawing them."""
+        return GridLayout(id="layout", width=A4_WIDTH - MARGIN_LEFT - MARGIN_RIGHT,
+                          height=A4_HEIGHT - cls.get_layout_y(title) - MARGIN_BOTTOM,
+                          padding=INSTRUCTION_BOX_PADDING,
+                          transform=f"translate({MARGIN_LEFT},{cls.get_layout_y(title)})")
 
+
+class Layout(SizedGroup):
+    def __init__(
+            self,
+            *args,
+            padding: int = 0,
+            label_mode: LabelMode = LabelMode.BACKGROUND,
+            resolve_label_overlaps: bool = False,
+            **kwargs,
+    ):
         super().__init__(*args, **kwargs)
-        self.direction = direction
-        self.alignment = alignment
         self.padding = padding
-        self._start = 0
+        self.label_mode = label_mode
+        self.resolve_label_overlaps = resolve_label_overlaps
+
+    def reserve(
+            self,
+            size: tuple[int | None, int | None],
+            size_behaviour: SizeBehaviour | None = None,
+    ) -> Placement | None:
+        """Reserve space for a group of the given size without drawing anything.
+
+        Returns the position, size and scale of the group in the layout or `None` if it does not fit.
+        """
+        raise NotImplementedError()
 
     def add_view(self, view: View, size_behaviour: SizeBehaviour = None) -> bool:
-        return self.add_group(
-            view.get_group(),
-            size_behaviour=size_behaviour,
-            draw_offset=view.get_draw_offset(),
-            clip_path=view.get_clip_path(),
-        )
+        placement = self.reserve(view.size, size_behaviour)
+        if placement is None:
+            return False
+        self.place_view(view, placement)
+        return True
+
+    def place_view(self, view: View, placement: Placement) -> None:
+        """Draw a view at a placement returned by `reserve`."""
+        self.place_group(view.get_group(), placement, draw_offset=view.get_draw_offset(), clip_path=view.get_clip_path())
 
     def add_group(
             self,
@@ -56,9 +88,88 @@ class LinearLayout(SizedGroup):
             draw_offset: tuple[int, int] | None = None,
             clip_path: draw.ClipPath | None = None,
         ) -> bool:
+        placement = self.reserve((group.width, group.height), size_behaviour)
+        if placement is None:
+            return False
+        self.place_group(group, placement, draw_offset=draw_offset, clip_path=clip_path)
+        return True
+
+    def place_group(
+            self,
+            group: SizedGroup,
+            placement: Placement,
+            draw_offset: tuple[int, int] | None = None,
+            clip_path: draw.ClipPath | None = None,
+    ) -> None:
+        """Draw a group at a placement returned by `reserve`."""
         if draw_offset is None:
             draw_offset = 0, 0
 
+        (x, y), size, scale = placement
+
+        orig_height = group.height
+
+        group.width = size[0]
+        group.height = size[1]
+
+        # place the group with a single composed transform instead of nested `<use>` elements
+        x += draw_offset[0] * scale[0]
+        y += draw_offset[1] * scale[1]
+        placed_group = draw.Group(transform=f"translate({x},{y}) scale({scale[0]},{scale[1]})", clip_path=clip_path)
+        placed_group.append(group)
+        self.append(placed_group)
+
+        texts = [
+            self._place_text(text, x + text.args['x'] * scale[0], y + scale[1] * (orig_height - text.args['y']))
+            for text in group.text
+        ]
+        if self.resolve_label_overlaps:
+            label_placer = LabelPlacer()
+            for text in texts:
+                label_placer.place(text, get_text_bounds(text))
+        if self.label_mode == LabelMode.BACKGROUND:
+            for text in texts:
+                self.append(get_text_background(text))
+                self.append(text)
+        elif self.label_mode == LabelMode.MERGED_BACKGROUND:
+            backgrounds = PathBatch()
+            for text in texts:
+                backgrounds.add_rectangle(*get_text_bounds(text), fill='white')
+            backgrounds.draw(self)
+            self.extend(texts)
+        else:
+            for text in texts:
+                text.args.update({
+                    'stroke': 'white',
+                    'stroke-width': LABEL_HALO_WIDTH,
+                    'stroke-linejoin': 'round',
+                    'paint-order': 'stroke',
+                })
+            self.extend(texts)
+
+    @staticmethod
+    def _place_text(text: draw.Text, x: float, y: float) -> draw.Text:
+        """Return a copy of `text` at the given position, leaving the registered text unchanged."""
+        placed_text = copy.copy(text)
+        placed_text.args = {**text.args, 'x': x, 'y': y}
+        return placed_text
+
+
+class LinearLayout(Layout):
+    def __init__(self, *args, direction: LayoutDirection, alignment: Alignment = None, **kwargs):
+        if alignment is None:
+            alignment = Alignment.CENTER
+
+        super().__init__(*args, **kwargs)
+        self.direction = direction
+        self.alignment = alignment
+        self._start = 0
+
+    def reserve(
+            self,
+            size: tuple[int | None, int | None],
+            size_behaviour: SizeBehaviour | None = None,
+    ) -> Placement | None:
         if self.direction == LayoutDirection.HORIZONTAL:
             available_size = self.width - self._start, self.height
         else:
@@ -66,58 +177,66 @@ class LinearLayout(SizedGroup):
 
         if size_behaviour is None:
             size_behaviour = FixedSizeBehaviour()
-        size, scale = size_behaviour.get_size_and_scale((group.width, group.height), available_size)
+        size, scale = size_behaviour.get_size_and_scale(size, available_size)
 
         if size[0] > available_size[0] or size[1] > available_size[1]:
-            return False
-
-        orig_height = group.height
-
-        group.width = size[0]
-        group.height = size[1]
+            return None
 
         if self.direction == LayoutDirection.HORIZONTAL:
             x = self._start
             if self.alignment == Alignment.START:
                 y = 0
             elif self.alignment == Alignment.END:
-                y = self.height - group.height
+                y = self.height - size[1]
             else:
-                y = (self.height - group.height) / 2
+                y = (self.height - size[1]) / 2
         else:
             y = self._start
             if self.alignment == Alignment.START:
                 x = 0
             elif self.alignment == Alignment.END:
-                x = self.width - group.width
+                x = self.width - size[0]
             else:
-                x = (self.width - group.width) / 2
-
-        scaled_group = draw.Group()
-        scaled_group.append(draw.Use(
-            group,
-            0,
-            0,
-            transform=f"scale({scale[0]},{scale[1]})",
-            clip_path=clip_path,
-        ))
-        for text in group.text:
-            text.args['x'] *= scale[0]
-            text.args['y'] = scale[1] * (orig_height - text.args['y'])
-            scaled_group.append(get_text_background(text))
-            scaled_group.append(draw.Use(
-                text,
-                0,
-                0,
-            ))
-
-        self.append(draw.Use(
-            scaled_group,
-            x + draw_offset[0] * scale[0],
-            y + draw_offset[1] * scale[1],
-        ))
-
-        self._start += group.width if self.direction == LayoutDirection.HORIZONTAL else group.height
+                x = (self.width - size[0]) / 2
+
+        self._start += size[0] if self.direction == LayoutDirection.HORIZONTAL else size[1]
         self._start += self.padding
 
-        return True
+        return (x, y), size, scale
+
+
+class GridLayout(Layout):
+    """Places groups in rows from left to right and rows from top to bottom, keeping their order.
+
+    A group that does not fit into the remaining width of the current row starts a new row below the tallest group
+    of the current row (next-fit shelf packing).
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._x = 0
+        self._y = 0
+        self._row_height = 0
+
+    def reserve(
+            self,
+            size: tuple[int | None, int | None],
+            size_behaviour: SizeBehaviour | None = None,
+    ) -> Placement | None:
+        if size_behaviour is None:
+            size_behaviour = FixedSizeBehaviour()
+
+        x, y, row_height = self._x, self._y, self._row_height
+        size, scale = size_behaviour.get_size_and_scale(size, (self.width - x, self.height - y))
+        if x > 0 and x + size[0] > self.width:
+            x, y, row_height = 0, y + row_height + self.padding, 0
+            size, scale = size_behaviour.get_size_and_scale(size, (self.width, self.height - y))
+
+        if x + size[0] > self.width or y + size[1] > self.height:
+            return None
+
+        self._x = x + size[0] + self.padding
+        self._y = y
+        self._row_height = max(row_height, size[1])
+
+        return (x, y), size, scale
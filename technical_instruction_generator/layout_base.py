@@ -1,8 +1,12 @@
 from dataclasses import dataclass
 from enum import Enum
+from typing import TYPE_CHECKING
 
 import drawsvg as draw
 
+if TYPE_CHECKING:
+    from .utils import PathBatch  # utils imports this module
+
 
 @dataclass
 class ViewBox:
@@ -21,10 +25,25 @@ class ViewBox:
 
 
 class SizedGroup(draw.Group):
-    def __init__(self, *args, width: int | None = None, height: int | None = None, flip_y: bool = False, **kwargs):
+    """A group of known size.
+
+    Steps drawn into it register their labels with `register_text` instead of drawing them. If `batch` is given, they
+    also add the lines and rectangles they would batch themselves to it, and the owner of the group draws it.
+    """
+
+    def __init__(
+            self,
+            *args,
+            width: int | None = None,
+            height: int | None = None,
+            flip_y: bool = False,
+            batch: 'PathBatch | None' = None,
+            **kwargs,
+    ):
         super().__init__(*args, **kwargs)
         self.width = width
         self.height = height
+        self.batch = batch
         self._text: list[draw.Text] = []
 
         if flip_y:
@@ -51,6 +70,12 @@ class Alignment(Enum):
     CENTER = 2
 
 
+class LabelMode(Enum):
+    BACKGROUND = 0  # white rectangle behind every label
+    MERGED_BACKGROUND = 1  # one white path behind all labels of a group
+    HALO = 2  # white stroke painted below the label's fill
+
+
 class SizeBehaviour:
     def get_size_and_scale(self, size: tuple[int, int], available_size: tuple[int, int]) -> tuple[tuple[int, int], tuple[float, float]]:
         raise NotImplementedError()
@@ -0,0 +1,248 @@
+"""Merges single page PDFs into one document while they are produced.
+
+Unlike `PyPDF2.PdfMerger`, which holds all pages until the merged document is written, `PdfStreamMerger` copies the
+objects of every appended PDF to the output right away, so memory is bounded by the largest input. Objects with the
+same content (fonts, images, graphics states, ...) are written once and shared by all pages using them.
+"""
+import hashlib
+import io
+import re
+from functools import cache
+from pathlib import Path
+from types import TracebackType
+from typing import BinaryIO
+
+from PyPDF2 import PdfReader
+from PyPDF2.generic import ArrayObject, DictionaryObject, IndirectObject, NumberObject, PdfObject, StreamObject
+
+STARTXREF_PATTERN = re.compile(rb"startxref\s+(\d+)")
+
+
+class PdfStreamMerger:
+    """Writes the pages of the appended PDFs to `path`.
+
+    With `append`, the pages are added to the existing PDF at `path` with an incremental update, so the existing
+    document is not read or rewritten beyond its trailer and page tree root.
+    """
+
+    def __init__(self, path: str | Path, append: bool = False) -> None:
+        self.path = Path(path)
+        self._offsets: dict[int, tuple[int, int]] = {}
+        self._digests: dict[bytes, int] = {}
+        self._page_numbers: list[int] = []
+
+        if append and self.path.exists() and self.path.stat().st_size > 0:
+            self._open_existing()
+        else:
+            self._file = open(self.path, 'wb')
+            self._start = self._position = 0
+            self._next_number = 0
+            self._prev_xref: int | None = None
+            self._info: IndirectObject | None = None
+            self._catalog_number = self._reserve()
+            self._pages_ref = IndirectObject(self._reserve(), 0, None)
+            self._old_kids: list[IndirectObject] = []
+            self._old_count = 0
+            self._write(b"%PDF-1.7\n%\xe2\xe3\xcf\xd3\n")
+
+    def _open_existing(self) -> None:
+        reader = PdfReader(self.path)
+        if '/Encrypt' in reader.trailer:
+            raise ValueError(f"Cannot append to the encrypted PDF {self.path}")
+        root = reader.trailer.raw_get('/Root')
+        pages = root.get_object().raw_get('/Pages')
+        pages_object = pages.get_object()
+
+        with open(self.path, 'rb') as file:
+            file.seek(max(0, self.path.stat().st_size - 1024))
+            xrefs = STARTXREF_PATTERN.findall(file.read())
+        if not xrefs:
+            raise ValueError(f"{self.path} has no cross-reference table")
+
+        self._file = open(self.path, 'ab')
+        self._start = self._position = self.path.stat().st_size
+        if '/Size' in reader.trailer:
+            self._next_number = reader.trailer['/Size'] - 1
+        else:
+            # PyPDF2 does not keep `/Size` from cross-reference streams, so use the highest object number read
+            self._next_number = max(max(idnums, default=0) for idnums in [*reader.xref.values(), reader.xref_objStm])
+        self._prev_xref = int(xrefs[-1])
+        self._info = reader.trailer.raw_get('/Info') if '/Info' in reader.trailer else None
+        self._catalog_number = root.idnum
+        self._pages_ref = pages
+        self._old_kids = list(pages_object.raw_get('/Kids'))
+        self._old_count = pages_object['/Count']
+        self._write(b"\n")
+
+    def __enter__(self) -> 'PdfStreamMerger':
+        return self
+
+    def __exit__(
+            self,
+            exc_type: type[BaseException] | None,
+            exc_value: BaseException | None,
+            traceback: TracebackType | None,
+    ) -> None:
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
+
+    def append(self, pdf: str | Path | BinaryIO | bytes) -> None:
+        """Copy all pages of `pdf` to the output."""
+        reader = PdfReader(io.BytesIO(pdf) if isinstance(pdf, bytes) else pdf)
+        if reader.is_encrypted:
+            raise ValueError("Cannot merge encrypted PDFs")
+
+        # numbers in the output of the objects of `reader` copied so far
+        numbers: dict[int, int] = {}
+        for page in reader.pages:
+            page_number = numbers[page.indirect_reference.idnum] = self._reserve()
+            entries = [(key, value) for key, value in page.items() if key != '/Parent']
+            body = self._serialize_dictionary(entries, numbers, {})
+            self._write_object(page_number, body[:-2] + b"/Parent %d %d R>>" % (
+                self._pages_ref.idnum, self._pages_ref.generation
+            ))
+            self._page_numbers.append(page_number)
+
+    def close(self) -> None:
+        """Write the page tree and cross-reference table after the last page and close the file."""
+        kids = [f"{kid.idnum} {kid.generation} R" for kid in self._old_kids]
+        kids.extend(f"{number} 0 R" for number in self._page_numbers)
+        self._write_object(
+            self._pages_ref.idnum,
+            f"<</Type/Pages/Kids[{' '.join(kids)}]/Count {self._old_count + len(self._page_numbers)}>>".encode(),
+            self._pages_ref.generation,
+        )
+        if self._prev_xref is None:
+            self._write_object(
+                self._catalog_number, f"<</Type/Catalog/Pages {self._pages_ref.idnum} 0 R>>".encode()
+            )
+
+        xref_position = self._position
+        xref = ["xref\n"]
+        if self._prev_xref is None:
+            self._offsets[0] = 0, 65535
+        numbers = sorted(self._offsets)
+        start = 0
+        for i in range(1, len(numbers) + 1):
+            # one subsection per run of consecutive object numbers
+            if i == len(numbers) or numbers[i] != numbers[i - 1] + 1:
+                xref.append(f"{numbers[start]} {i - start}\n")
+                for number in numbers[start:i]:
+                    offset, generation = self._offsets[number]
+                    xref.append(f"{offset:010d} {generation:05d} {'f' if number == 0 else 'n'} \n")
+                start = i
+
+        trailer = f"/Size {self._next_number + 1}/Root {self._catalog_number} 0 R"
+        if self._info is not None:
+            trailer += f"/Info {self._info.idnum} {self._info.generation} R"
+        if self._prev_xref is not None:
+            trailer += f"/Prev {self._prev_xref}"
+        xref.append(f"trailer\n<<{trailer}>>\nstartxref\n{xref_position}\n%%EOF\n")
+        self._write("".join(xref).encode())
+        self._file.close()
+
+    def abort(self) -> None:
+        """Close the file, leaving an existing PDF as it was before appending."""
+        self._file.truncate(self._start)
+        self._file.close()
+        if self._start == 0:
+            self.path.unlink()
+
+    def _write(self, data: bytes) -> None:
+        self._file.write(data)
+        self._position += len(data)
+
+    def _reserve(self) -> int:
+        self._next_number += 1
+        return self._next_number
+
+    def _write_object(self, number: int, body: bytes, generation: int = 0) -> None:
+        self._offsets[number] = self._position, generation
+        self._write(b"%d %d obj\n%s\nendobj\n" % (number, generation, body))
+
+    def _copy(self, ref: IndirectObject, numbers: dict[int, int], in_progress: dict[int, int | None]) -> int:
+        """Copy the object `ref` points to (with all objects it references) and return its number in the output."""
+        number = numbers.get(ref.idnum)
+        if number is not None:
+            return number
+        if ref.idnum in in_progress:
+            # a reference cycle, the object gets a number before its content is known and is not deduplicated
+            if in_progress[ref.idnum] is None:
+                in_progress[ref.idnum] = self._reserve()
+            return in_progress[ref.idnum]
+
+        in_progress[ref.idnum] = None
+        body = self._serialize(ref.get_object(), numbers, in_progress)
+        number = in_progress.pop(ref.idnum)
+        if number is None:
+            digest = hashlib.blake2b(body, digest_size=16).digest()
+            number = self._digests.get(digest)
+            if number is None:
+                number = self._digests[digest] = self._reserve()
+                self._write_object(number, body)
+        else:
+            self._write_object(number, body)
+        numbers[ref.idnum] = number
+        return number
+
+    def _serialize(self, obj: PdfObject, numbers: dict[int, int], in_progress: dict[int, int | None]) -> bytes:
+        """Serialize `obj` with the references replaced by the numbers of the referenced objects in the output."""
+        kind = _get_kind(type(obj))
+        if kind is IndirectObject:
+            return b"%d 0 R" % self._copy(obj, numbers, in_progress)
+        if kind is StreamObject:
+            data = obj._data
+            entries = [(key, value) for key, value in obj.items() if key != '/Length']
+            entries_body = self._serialize_dictionary(entries, numbers, in_progress)
+            return entries_body[:-2] + b"/Length %d>>\nstream\n%s\nendstream" % (len(data), data)
+        if kind is DictionaryObject:
+            return self._serialize_dictionary(list(obj.items()), numbers, in_progress)
+        if kind is ArrayObject:
+            return b"[" + b" ".join(self._serialize(item, numbers, in_progress) for item in obj) + b"]"
+        if kind is NumberObject:
+            return b"%d" % obj
+        buffer = io.BytesIO()
+        obj.write_to_stream(buffer, None)
+        return buffer.getvalue()
+
+    def _serialize_dictionary(
+            self,
+            entries: list[tuple[PdfObject, PdfObject]],
+            numbers: dict[int, int],
+            in_progress: dict[int, int | None],
+    ) -> bytes:
+        return b"<<" + b"".join(
+            self._serialize(key, numbers, in_progress) + b" " + self._serialize(value, numbers, in_progress)
+            for key, value in entries
+        ) + b">>"
+
+
+def linearize_pdf(path: str | Path) -> None:
+    """Rewrite the PDF at `path` linearized ("fast web view"), so viewers can show the first page before the whole
+    file is loaded, and with the objects in compressed object streams and a cross-reference stream.
+
+    Needs the optional dependency `pikepdf`. Appending to a linearized PDF keeps it valid, but no longer linearized.
+    """
+    try:
+        import pikepdf
+    except ImportError as e:
+        raise RuntimeError("Linearizing PDFs needs pikepdf") from e
+
+    with pikepdf.open(path, allow_overwriting_input=True) as pdf:
+        pdf.save(
+            path,
+            linearize=True,
+            object_stream_mode=pikepdf.ObjectStreamMode.generate,
+            compress_streams=True,
+        )
+
+
+@cache
+def _get_kind(obj_type: type) -> type | None:
+    # cached per type, as `isinstance` checks against the PyPDF2 classes are slow
+    for kind in (IndirectObject, StreamObject, DictionaryObject, ArrayObject, NumberObject):
+        if issubclass(obj_type, kind):
+            return kind
+    return None
@@ -0,0 +1,436 @@
+"""Writes pages directly to a PDF, without SVG files and an external converter.
+
+Only the subset of SVG drawn by the steps and layouts is supported: groups with transforms and clip paths, `<use>`,
+rectangles, circles, paths and text with `<tspan>`s. Text is set in the standard PDF fonts, so no fonts are embedded
+and text widths (for `text-anchor`) use the approximate metrics of `labels`.
+"""
+import math
+import re
+import weakref
+import zlib
+from functools import cache
+from types import TracebackType
+from typing import BinaryIO
+from xml.sax.saxutils import unescape
+
+import drawsvg as draw
+
+from .dimensions import PDF_POINTS_PER_UNIT
+from .labels import get_text_width
+from .style import FONT_FAMILY_TECH, FONT_FAMILY_TEXT
+from .writers import get_children
+
+# standard fonts (regular, bold) replacing the fonts of the drawings
+FONTS = {
+    FONT_FAMILY_TECH: ('Helvetica-Bold', 'Helvetica-Bold'),
+    FONT_FAMILY_TEXT: ('Times-Roman', 'Times-Bold'),
+}
+DEFAULT_FONTS = ('Helvetica', 'Helvetica-Bold')
+# baseline offset in em for the `dominant-baseline` values, in drawing coordinates (y pointing down)
+BASELINE_SHIFTS = {'middle': 0.3, 'central': 0.35, 'hanging': 0.8}
+COLORS = {
+    'black': (0, 0, 0),
+    'white': (1, 1, 1),
+    'gray': (0.5, 0.5, 0.5),
+    'grey': (0.5, 0.5, 0.5),
+    'red': (1, 0, 0),
+    'green': (0, 0.5, 0),
+    'blue': (0, 0, 1),
+}
+LINE_JOINS = {'miter': 0, 'round': 1, 'bevel': 2}
+LINE_CAPS = {'butt': 0, 'round': 1, 'square': 2}
+# presentation attributes inherited from groups and `<use>` elements
+INHERITED_ATTRIBUTES = (
+    'fill', 'fill-opacity', 'stroke', 'stroke-width', 'stroke-opacity', 'stroke-dasharray', 'stroke-linejoin',
+    'stroke-linecap', 'font-family', 'font-weight', 'font-size', 'text-anchor', 'dominant-baseline', 'paint-order',
+)
+# control point distance of a quarter circle approximated by a cubic Bézier curve
+KAPPA = 4 * (math.sqrt(2) - 1) / 3
+PATH_TOKEN_PATTERN = re.compile(r"[MmLlHhVvCcZz]|-?(?:\d+\.?\d*|\.\d+)(?:[eE][-+]?\d+)?")
+TRANSFORM_PATTERN = re.compile(r"(\w+)\s*\(([^)]*)\)")
+NUMBER_SEPARATOR_PATTERN = re.compile(r"[\s,]+")
+# the bounding box of form XObjects, which is only used for clipping
+XOBJECT_BBOX = "[-100000 -100000 100000 100000]"
+
+
+class PdfDocument:
+    """Writes drawings as the pages of one PDF, streaming every page to `file` as soon as it is added.
+
+    Like `LxmlWriter`, elements referenced by `<use>` are written once (as form XObjects) and shared by all pages as
+    long as the referenced drawsvg element is alive.
+    """
+
+    def __init__(self, file: BinaryIO, unit: float = PDF_POINTS_PER_UNIT, compress: bool = True) -> None:
+        self.file = file
+        self.unit = unit
+        self.compress = compress
+        self._position = 0
+        self._offsets: dict[int, int] = {}
+        self._next_number = 0
+        self._catalog_number = self._reserve()
+        self._pages_number = self._reserve()
+        self._resources_number = self._reserve()
+        self._page_numbers: list[int] = []
+        self._fonts: dict[str, str] = {}
+        self._graphics_states: dict[tuple[float, float], str] = {}
+        self._xobject_numbers: list[int] = []
+        self._xobjects: dict[int, str] = {}
+        self._refs: dict[int, weakref.ref] = {}
+        self._write(b"%PDF-1.4\n%\xe2\xe3\xcf\xd3\n")
+
+    def __enter__(self) -> 'PdfDocument':
+        return self
+
+    def __exit__(
+            self,
+            exc_type: type[BaseException] | None,
+            exc_value: BaseException | None,
+            traceback: TracebackType | None,
+    ) -> None:
+        if exc_type is None:
+            self.close()
+
+    def add_page(self, drawing: draw.Drawing) -> None:
+        x, y, width, height = drawing.view_box
+        # flip the PDF coordinate system to the one of the drawing
+        ops = [f"{_fmt(self.unit)} 0 0 {_fmt(-self.unit)} {_fmt(-x * self.unit)} {_fmt((y + height) * self.unit)} cm"]
+        for element in drawing.all_elements():
+            self._render(element, ops, {})
+
+        content_number = self._write_stream("", "\n".join(ops).encode('latin-1'))
+        page_number = self._reserve()
+        self._write_object(page_number, (
+            f"<< /Type /Page /Parent {self._pages_number} 0 R "
+            f"/MediaBox [0 0 {_fmt(width * self.unit)} {_fmt(height * self.unit)}] "
+            f"/Resources {self._resources_number} 0 R /Contents {content_number} 0 R >>"
+        ))
+        self._page_numbers.append(page_number)
+
+    def close(self) -> None:
+        """Write the document structure after the last page."""
+        fonts = " ".join(
+            f"/{name} << /Type /Font /Subtype /Type1 /BaseFont /{base_font} /Encoding /WinAnsiEncoding >>"
+            for base_font, name in self._fonts.items()
+        )
+        graphics_states = " ".join(
+            f"/{name} << /Type /ExtGState /CA {_fmt(stroke_opacity)} /ca {_fmt(fill_opacity)} >>"
+            for (stroke_opacity, fill_opacity), name in self._graphics_states.items()
+        )
+        xobjects = " ".join(f"/X{number} {number} 0 R" for number in self._xobject_numbers)
+        self._write_object(
+            self._resources_number,
+            f"<< /Font << {fonts} >> /ExtGState << {graphics_states} >> /XObject << {xobjects} >> >>",
+        )
+        kids = " ".join(f"{number} 0 R" for number in self._page_numbers)
+        self._write_object(
+            self._pages_number, f"<< /Type /Pages /Kids [{kids}] /Count {len(self._page_numbers)} >>"
+        )
+        self._write_object(self._catalog_number, f"<< /Type /Catalog /Pages {self._pages_number} 0 R >>")
+
+        xref_position = self._position
+        xref = [f"xref\n0 {self._next_number + 1}\n", "0000000000 65535 f \n"]
+        xref.extend(f"{self._offsets[number]:010d} 00000 n \n" for number in range(1, self._next_number + 1))
+        xref.append(
+            f"trailer\n<< /Size {self._next_number + 1} /Root {self._catalog_number} 0 R >>\n"
+            f"startxref\n{xref_position}\n%%EOF\n"
+        )
+        self._write("".join(xref).encode('latin-1'))
+
+    def _write(self, data: bytes) -> None:
+        self.file.write(data)
+        self._position += len(data)
+
+    def _reserve(self) -> int:
+        self._next_number += 1
+        return self._next_number
+
+    def _write_object(self, number: int, body: str | bytes) -> None:
+        if isinstance(body, str):
+            body = body.encode('latin-1')
+        self._offsets[number] = self._position
+        self._write(b"%d 0 obj\n%s\nendobj\n" % (number, body))
+
+    def _write_stream(self, entries: str, data: bytes) -> int:
+        if self.compress:
+            data = zlib.compress(data)
+            entries += " /Filter /FlateDecode"
+        number = self._reserve()
+        self._write_object(
+            number, b"<< %s /Length %d >>\nstream\n%s\nendstream" % (entries.encode('latin-1'), len(data), data)
+        )
+        return number
+
+    def _get_xobject(self, element: draw.DrawingElement) -> str:
+        """Return the resource name of the form XObject drawing `element`, writing it on first use."""
+        name = self._xobjects.get(id(element))
+        if name is None:
+            ops = []
+            self._render(element, ops, {})
+            number = self._write_stream(
+                f"/Type /XObject /Subtype /Form /BBox {XOBJECT_BBOX} /Resources {self._resources_number} 0 R",
+                "\n".join(ops).encode('latin-1'),
+            )
+            self._xobject_numbers.append(number)
+            name = self._xobjects[id(element)] = f"X{number}"
+            self._refs[id(element)] = weakref.ref(element, lambda _, key=id(element): self._forget(key))
+        return name
+
+    def _forget(self, key: int) -> None:
+        self._xobjects.pop(key, None)
+        self._refs.pop(key, None)
+
+    def _get_font(self, font_family: str | None, bold: bool) -> str:
+        base_font = FONTS.get(font_family, DEFAULT_FONTS)[bold]
+        name = self._fonts.get(base_font)
+        if name is None:
+            name = self._fonts[base_font] = f"F{len(self._fonts) + 1}"
+        return name
+
+    def _get_graphics_state(self, stroke_opacity: float, fill_opacity: float) -> str:
+        key = stroke_opacity, fill_opacity
+        name = self._graphics_states.get(key)
+        if name is None:
+            name = self._graphics_states[key] = f"G{len(self._graphics_states) + 1}"
+        return name
+
+    def _render(self, element: draw.DrawingElement, ops: list[str], inherited: dict[str, object]) -> None:
+        tag = element.TAG_NAME
+        args = element.args
+        if tag in ('g', 'use'):
+            style = _inherit(inherited, args)
+            ops.append("q")
+            transform = args.get('transform')
+            if transform is not None:
+                _add_transform(transform, ops)
+            clip_path = args.get('clip-path')
+            if isinstance(clip_path, draw.ClipPath):
+                for child in get_children(clip_path):
+                    _add_shape(child, ops)
+                ops.append("W n")
+            if tag == 'g':
+                for child in get_children(element):
+                    self._render(child, ops, style)
+            else:
+                x, y = args.get('x', 0), args.get('y', 0)
+                if x or y:
+                    ops.append(f"1 0 0 1 {_fmt(x)} {_fmt(y)} cm")
+                ops.append(f"/{self._get_xobject(args['xlink:href'])} Do")
+            ops.append("Q")
+        elif tag in ('rect', 'circle', 'path'):
+            style = _inherit(inherited, args)
+            fill = _get_color(style.get('fill', 'black'))
+            stroke = _get_color(style.get('stroke', 'none'))
+            if fill is None and stroke is None:
+                return
+            ops.append("q")
+            self._add_paint_style(style, fill, stroke, ops)
+            _add_shape(element, ops)
+            ops.append("B" if fill is not None and stroke is not None else "f" if fill is not None else "S")
+            ops.append("Q")
+        elif tag == 'text':
+            self._add_text(element, ops, _inherit(inherited, args))
+        elif tag not in ('clipPath', 'defs'):
+            raise ValueError(f"Cannot write <{tag}> elements to PDF")
+
+    def _add_paint_style(
+            self,
+            style: dict[str, object],
+            fill: str | None,
+            stroke: str | None,
+            ops: list[str],
+    ) -> None:
+        opacity = float(style.get('opacity', 1))
+        fill_opacity = float(style.get('fill-opacity', 1)) * opacity
+        stroke_opacity = float(style.get('stroke-opacity', 1)) * opacity
+        if fill_opacity != 1 or stroke_opacity != 1:
+            ops.append(f"/{self._get_graphics_state(stroke_opacity, fill_opacity)} gs")
+        if fill is not None:
+            ops.append(f"{fill} rg")
+        if stroke is not None:
+            ops.append(f"{stroke} RG {_fmt(float(style.get('stroke-width', 1)))} w")
+            dash_array = style.get('stroke-dasharray')
+            if dash_array is not None and dash_array != 'none':
+                dashes = [_fmt(float(nr)) for nr in NUMBER_SEPARATOR_PATTERN.split(str(dash_array).strip())]
+                ops.append(f"[{' '.join(dashes)}] 0 d")
+            line_join = style.get('stroke-linejoin')
+            if line_join in LINE_JOINS:
+                ops.append(f"{LINE_JOINS[line_join]} j")
+            line_cap = style.get('stroke-linecap')
+            if line_cap in LINE_CAPS:
+                ops.append(f"{LINE_CAPS[line_cap]} J")
+
+    def _add_text(self, text: draw.Text, ops: list[str], style: dict[str, object]) -> None:
+        font_size = float(style.get('font-size', 16))
+        font_family = style.get('font-family')
+        bold = style.get('font-weight') == 'bold'
+
+        # text runs as (dx, content, bold), the first one being the text itself
+        runs = [(0.0, unescape(text.escaped_text), bold)]
+        for child in get_children(text):
+            if child.TAG_NAME != 'tspan':
+                raise ValueError(f"Cannot write <{child.TAG_NAME}> elements in text to PDF")
+            runs.append((
+                float(child.args.get('dx', 0)),
+                unescape(child.escaped_text),
+                child.args.get('font-weight', style.get('font-weight')) == 'bold',
+            ))
+
+        x = float(style.get('x', 0))
+        y = float(style.get('y', 0)) + font_size * BASELINE_SHIFTS.get(style.get('dominant-baseline'), 0)
+        text_anchor = style.get('text-anchor', 'start')
+        if text_anchor != 'start':
+            width = sum(dx + get_text_width(content, font_size, font_family, run_bold) for dx, content, run_bold in runs)
+            x -= width if text_anchor == 'end' else width / 2
+
+        fill = _get_color(style.get('fill', 'black'))
+        stroke = _get_color(style.get('stroke', 'none'))
+        ops.append("q")
+        self._add_paint_style(style, fill, stroke, ops)
+        # halos (`paint-order: stroke`) are stroked in a first pass below the filled text
+        if stroke is not None and style.get('paint-order') == 'stroke':
+            render_modes = [1, 0] if fill is not None else [1]
+        else:
+            render_modes = [2 if stroke is not None else 0] if fill is not None else [1]
+        for render_mode in render_modes:
+            # the text matrix flips the text back upright in the flipped coordinate system of the page
+            ops.append(f"BT {render_mode} Tr 1 0 0 -1 {_fmt(x)} {_fmt(y)} Tm")
+            for dx, content, run_bold in runs:
+                if dx:
+                    ops.append(f"[{_fmt(-dx / font_size * 1000)}] TJ")
+                ops.append(f"/{self._get_font(font_family, run_bold)} {_fmt(font_size)} Tf {_encode_text(content)} Tj")
+            ops.append("ET")
+        ops.append("Q")
+
+
+def _inherit(inherited: dict[str, object], args: dict[str, object]) -> dict[str, object]:
+    if not inherited:
+        return args
+    style = {key: value for key, value in inherited.items() if key in INHERITED_ATTRIBUTES}
+    style.update(args)
+    return style
+
+
+def _fmt(value: float) -> str:
+    res = f"{value:.3f}".rstrip('0').rstrip('.')
+    return "0" if res == "-0" else res
+
+
+@cache
+def _get_color(color: str) -> str | None:
+    """Return `color` as PDF RGB components or `None` for `none`."""
+    if color == 'none':
+        return None
+    if color.startswith('#'):
+        if len(color) == 4:
+            color = '#' + ''.join(2 * c for c in color[1:])
+        rgb = tuple(int(color[i:i + 2], 16) / 255 for i in (1, 3, 5))
+    elif color in COLORS:
+        rgb = COLORS[color]
+    else:
+        raise ValueError(f"Unknown color `{color}`")
+    return " ".join(_fmt(c) for c in rgb)
+
+
+def _encode_text(text: str) -> str:
+    encoded = text.encode('cp1252', errors='replace').decode('latin-1')
+    return "(" + encoded.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)") + ")"
+
+
+def _add_transform(transform: str, ops: list[str]) -> None:
+    for name, values in TRANSFORM_PATTERN.findall(transform):
+        values = [float(value) for value in NUMBER_SEPARATOR_PATTERN.split(values.strip())]
+        if name == 'translate':
+            matrix = 1, 0, 0, 1, values[0], values[1] if len(values) > 1 else 0
+        elif name == 'scale':
+            matrix = values[0], 0, 0, values[1] if len(values) > 1 else values[0], 0, 0
+        elif name == 'rotate':
+            angle = math.radians(values[0])
+            cx, cy = values[1:3] if len(values) == 3 else (0, 0)
+            cos, sin = math.cos(angle), math.sin(angle)
+            matrix = cos, sin, -sin, cos, cx - cos * cx + sin * cy, cy - sin * cx - cos * cy
+        elif name == 'matrix':
+            matrix = values
+        else:
+            raise ValueError(f"Cannot write `{name}` transforms to PDF")
+        ops.append(f"{' '.join(_fmt(value) for value in matrix)} cm")
+
+
+def _add_shape(element: draw.DrawingElement, ops: list[str]) -> None:
+    """Add the path construction operators of a rectangle, circle or path."""
+    args = element.args
+    tag = element.TAG_NAME
+    if tag == 'rect':
+        x, y = float(args.get('x', 0)), float(args.get('y', 0))
+        width, height = float(args['width']), float(args['height'])
+        rx = float(args.get('rx', args.get('ry', 0)))
+        ry = float(args.get('ry', rx))
+        if rx and ry:
+            _add_rounded_rectangle(x, y, width, height, min(rx, width / 2), min(ry, height / 2), ops)
+        else:
+            ops.append(f"{_fmt(x)} {_fmt(y)} {_fmt(width)} {_fmt(height)} re")
+    elif tag == 'circle':
+        cx, cy, r = float(args.get('cx', 0)), float(args.get('cy', 0)), float(args['r'])
+        _add_rounded_rectangle(cx - r, cy - r, 2 * r, 2 * r, r, r, ops)
+    elif tag == 'path':
+        _add_path_data(args['d'], ops)
+    else:
+        raise ValueError(f"Cannot write <{tag}> elements to PDF")
+
+
+def _add_rounded_rectangle(x: float, y: float, width: float, height: float, rx: float, ry: float, ops: list[str]) -> None:
+    kx, ky = rx * KAPPA, ry * KAPPA
+    x1, y1 = x + width, y + height
+    ops.append(" ".join([
+        f"{_fmt(x + rx)} {_fmt(y)} m {_fmt(x1 - rx)} {_fmt(y)} l",
+        f"{_fmt(x1 - rx + kx)} {_fmt(y)} {_fmt(x1)} {_fmt(y + ry - ky)} {_fmt(x1)} {_fmt(y + ry)} c",
+        f"{_fmt(x1)} {_fmt(y1 - ry)} l",
+        f"{_fmt(x1)} {_fmt(y1 - ry + ky)} {_fmt(x1 - rx + kx)} {_fmt(y1)} {_fmt(x1 - rx)} {_fmt(y1)} c",
+        f"{_fmt(x + rx)} {_fmt(y1)} l",
+        f"{_fmt(x + rx - kx)} {_fmt(y1)} {_fmt(x)} {_fmt(y1 - ry + ky)} {_fmt(x)} {_fmt(y1 - ry)} c",
+        f"{_fmt(x)} {_fmt(y + ry)} l",
+        f"{_fmt(x)} {_fmt(y + ry - ky)} {_fmt(x + rx - kx)} {_fmt(y)} {_fmt(x + rx)} {_fmt(y)} c h",
+    ]))
+
+
+def _add_path_data(d: str, ops: list[str]) -> None:
+    """Add the operators of SVG path data with straight lines and cubic curves."""
+    tokens = PATH_TOKEN_PATTERN.findall(d)
+    x = y = start_x = start_y = 0.0
+    command = None
+    path = []
+    i = 0
+    while i < len(tokens):
+        if tokens[i].isalpha():
+            command = tokens[i]
+            i += 1
+            if command in 'Zz':
+                path.append("h")
+                x, y = start_x, start_y
+                continue
+        elif command is None:
+            raise ValueError(f"Invalid path data `{d}`")
+
+        relative = command.islower()
+        values = tokens[i:i + {'m': 2, 'l': 2, 'h': 1, 'v': 1, 'c': 6}[command.lower()]]
+        i += len(values)
+        values = [float(value) for value in values]
+        if command in 'Mm':
+            x, y = (x + values[0], y + values[1]) if relative else values
+            start_x, start_y = x, y
+            path.append(f"{_fmt(x)} {_fmt(y)} m")
+            # further coordinate pairs are lines
+            command = 'l' if relative else 'L'
+        elif command in 'LlHhVv':
+            if command in 'Ll':
+                x, y = (x + values[0], y + values[1]) if relative else values
+            elif command in 'Hh':
+                x = x + values[0] if relative else values[0]
+            else:
+                y = y + values[0] if relative else values[0]
+            path.append(f"{_fmt(x)} {_fmt(y)} l")
+        else:
+            if relative:
+                values = [value + (x if j % 2 == 0 else y) for j, value in enumerate(values)]
+            x, y = values[4], values[5]
+            path.append(f"{' '.join(_fmt(value) for value in values)} c")
+    ops.append(" ".join(path))
@@ -0,0 +1,54 @@
+import math
+from typing import Any
+
+from .layout_base import ViewBox
+
+
+def get_bounds(view_box: ViewBox) -> tuple[float, float, float, float]:
+    """Return `(x0, y0, x1, y1)` of a view box, allowing for negative width or height."""
+    x0, x1 = sorted((view_box.x, view_box.x + view_box.width))
+    y0, y1 = sorted((view_box.y, view_box.y + view_box.height))
+    return x0, y0, x1, y1
+
+
+def intersects(bounds: tuple[float, float, float, float], other: tuple[float, float, float, float]) -> bool:
+    return bounds[0] <= other[2] and other[0] <= bounds[2] and bounds[1] <= other[3] and other[1] <= bounds[3]
+
+
+class GridIndex:
+    """Uniform grid of buckets over axis-aligned boxes.
+
+    Every item is stored in all cells its box touches, so an intersection query only tests the items of the cells
+    touched by the query box.
+    """
+
+    def __init__(self, cell_size: float = 128) -> None:
+        self.cell_size = cell_size
+        self._cells: dict[tuple[int, int], list[int]] = {}
+        self._items: list[tuple[Any, tuple[float, float, float, float]]] = []
+
+    def __len__(self) -> int:
+        return len(self._items)
+
+    def insert(self, item: Any, view_box: ViewBox) -> None:
+        bounds = get_bounds(view_box)
+        item_idx = len(self._items)
+        self._items.append((item, bounds))
+        for cell in self._get_cells(bounds):
+            self._cells.setdefault(cell, []).append(item_idx)
+
+    def query(self, view_box: ViewBox) -> list[Any]:
+        """Return all items intersecting `view_box` in insertion order."""
+        bounds = get_bounds(view_box)
+        item_idxs = set()
+        for cell in self._get_cells(bounds):
+            item_idxs.update(self._cells.get(cell, ()))
+        return [
+            self._items[item_idx][0] for item_idx in sorted(item_idxs)
+            if intersects(self._items[item_idx][1], bounds)
+        ]
+
+    def _get_cells(self, bounds: tuple[float, float, float, float]) -> list[tuple[int, int]]:
+        i0, j0 = math.floor(bounds[0] / self.cell_size), math.floor(bounds[1] / self.cell_size)
+        i1, j1 = math.floor(bounds[2] / self.cell_size), math.floor(bounds[3] / self.cell_size)
+        return [(i, j) for i in range(i0, i1 + 1) for j in range(j0, j1 + 1)]
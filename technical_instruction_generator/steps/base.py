@@ -1,7 +1,11 @@
 from abc import ABC, abstractmethod
+from typing import Any
 
 from ..layout_base import SizedGroup, ViewBox
 
+# simplified drawing of a step: ('dot', x, y), ('line', x0, y0, x1, y1) or ('use', element, x, y)
+Marker = tuple[Any, ...]
+
 
 class Step(ABC):
     def __init__(self, identifier: str | None = None) -> None:
@@ -29,6 +33,18 @@ class Step(ABC):
     def view_box_closeup(self) -> ViewBox:
         raise NotImplementedError
 
+    @property
+    def view_box_footprint(self) -> ViewBox:
+        """Region drawn by the step, without the outline of the modified body."""
+        return self.view_box
+
+    def get_lod_markers(self, min_size: float) -> list[Marker] | None:
+        """Return markers replacing the drawing of the step if its features are smaller than `min_size`.
+
+        Returns `None` if the step is drawn as usual.
+        """
+        return None
+
     @abstractmethod
     def get_instruction(self, dim_ref_pt: tuple[float, float] | None = None) -> str:
         raise NotImplementedError
@@ -4,13 +4,14 @@ from abc import ABC
 
 import drawsvg as draw
 
-from .base import Step
+from .base import Marker, Step
 from .drilling import DrillHole
 from .sawing import Cut
 from ..dimensions import FACE_ANNOTATION_OFFSET, FONT_SIZE_BASE
 from ..layout_base import LayoutDirection, SizedGroup, ViewBox
 from ..style import FONT_FAMILY_TECH, DASH
-from ..utils import sorted_nicely
+from ..symbols import get_bar_outline, get_face_outline, get_hole_glyph
+from ..utils import PathBatch, get_color, sorted_nicely
 
 
 class Body:
@@ -23,13 +24,6 @@ class ModifyBodyStep(Step, ABC):
         super().__init__(identifier)
         self.body = body
         self.step = step
-        self._active_bodies = None
-
-    def set_active_body(self, body: Body) -> None:
-        self._active_bodies = [body]
-
-    def set_active_bodies(self, active_bodies: list[Body]) -> None:
-        self._active_bodies = active_bodies
 
 
 class ModifyMultiBodyStep(Step):
@@ -37,13 +31,6 @@ class ModifyMultiBodyStep(Step):
         super().__init__(identifier=step.identifier)
         self.bodies = bodies
         self.step = step
-        self._active_bodies = None
-
-    def set_active_body(self, body: Body) -> None:
-        self._active_bodies = [body]
-
-    def set_active_bodies(self, active_bodies: list[Body]) -> None:
-        self._active_bodies = active_bodies
 
     def get_common_bodies(self, other: 'ModifyMultiBodyStep') -> list[Body]:
         return [body for body in other.bodies if body in self.bodies]
@@ -109,6 +96,13 @@ class ModifyMultiBodyStep(Step):
     def view_box_closeup(self) -> ViewBox:
         return self.step.view_box_closeup
 
+    @property
+    def view_box_footprint(self) -> ViewBox:
+        return self.step.view_box_footprint
+
+    def get_lod_markers(self, min_size: float) -> list[Marker] | None:
+        return self.step.get_lod_markers(min_size)
+
     def draw(
             self,
             group: SizedGroup,
@@ -120,8 +114,6 @@ class ModifyMultiBodyStep(Step):
             faded: bool = False,
             dim_ref_pt: tuple[float, float] | None = None
     ) -> None:
-        # if self._active_bodies is not None:
-        #     faded |= not set(self._active_bodies).issubset(self.bodies)
         self.step.draw(group, x, y, active, dimensions, close_up, faded, dim_ref_pt)
 
 
@@ -136,6 +128,9 @@ class Face(Body):
             return False
         return self.width == other.width and self.height == other.height
 
+    def __hash__(self) -> int:
+        return hash((self.width, self.height))
+
     def __str__(self) -> str:
         return f"Fläche {self.identifier}"
 
@@ -148,7 +143,7 @@ class Face(Body):
         return ViewBox(0, 0, math.ceil(self.width), math.ceil(self.height))
 
     def draw(self, group: SizedGroup, x=0, y=0) -> None:
-        group.append(draw.Rectangle(x, y, self.width, self.height, stroke='black', fill='none'))
+        group.append(draw.Use(get_face_outline(self.width, self.height), x, y))
 
 
 class ModifyFaceStep(ModifyBodyStep):
@@ -183,6 +178,16 @@ class ModifyFaceStep(ModifyBodyStep):
         y1 = max(self.step.view_box_closeup.y, self.face.view_box.y + self.face.view_box.height)
         return ViewBox(x0, y0, x1 - x0, y1 - y0)
 
+    @property
+    def view_box_footprint(self) -> ViewBox:
+        return self.step.view_box
+
+    def get_lod_markers(self, min_size: float) -> list[Marker] | None:
+        markers = self.step.get_lod_markers(min_size)
+        if markers is None:
+            return None
+        return [('use', get_face_outline(self.face.width, self.face.height), 0, 0), *markers]
+
     def get_instruction(self, dim_ref_pt: tuple[float, float] | None = None) -> str:
         dim_ref_pt = (
             self.face.width if self.ref_x_opposite else 0.0,
@@ -201,8 +206,6 @@ class ModifyFaceStep(ModifyBodyStep):
         faded: bool = False,
         dim_ref_pt: tuple[float, float] | None = None
     ) -> None:
-        # if self._active_bodies is not None:
-        #     faded |= not set(self._active_bodies).issubset({self.body})
         self.face.draw(group, x, y)
 
         dim_ref_pt = (
@@ -283,6 +286,9 @@ class Bar(Body):
             return False
         return other.width == self.width and other.height == self.height and other.length == self.length
 
+    def __hash__(self) -> int:
+        return hash((self.width, self.height, self.length))
+
     def get_opposite_face(self, identifier: str) -> Face:
         if identifier == 'A':
             return self.faces['C']
@@ -344,6 +350,10 @@ class ModifyBarStep(ModifyBodyStep):
         assert isinstance(self.body, Bar)
         return self.body
 
+    @property
+    def outline(self) -> draw.Group:
+        return get_bar_outline(tuple((self.ys[key], face.width, face.height) for key, face in self.bar.faces.items()))
+
     def get_instruction(self, dim_ref_pt: tuple[float, float] | None = None) -> str:
         if dim_ref_pt is None:
             dim_ref_pt = (0, 0)
@@ -366,6 +376,26 @@ class ModifyBarStep(ModifyBodyStep):
         y1 = max(self.step.view_box_closeup.y, self.face.view_box.y + self.face.view_box.height)
         return ViewBox(x0, y0 - self.ys[self.face_identifier], x1 - x0, y1 - y0)
 
+    @property
+    def view_box_footprint(self) -> ViewBox:
+        # the step is transferred to the other faces, so it spans the whole layout height
+        view_box = self.step.view_box
+        return ViewBox(view_box.x, 0, view_box.width, self.layout_height)
+
+    def get_lod_markers(self, min_size: float) -> list[Marker] | None:
+        if not isinstance(self.step, DrillHole) or self.step.get_lod_markers(min_size) is None:
+            return None
+
+        markers = [('use', self.outline, 0, 0), ('dot', self.step.x, self.ys[self.face_identifier] + self.step.y)]
+        if self.step.through:
+            face = self.bar.get_opposite_face(self.face_identifier)
+            markers.append(('dot', self.step.x, self.ys[face.identifier] + face.height - self.step.y))
+        for face, face_sign in zip(self.bar.get_adjacent_faces(self.face_identifier), [1, -1]):
+            height = face.height if self.step.through else self.step.depth
+            y0 = self.ys[face.identifier] if face_sign >= 0 else self.ys[face.identifier] + face.height
+            markers.append(('line', self.step.x, y0, self.step.x, y0 + face_sign * height))
+        return markers
+
     def draw(
         self,
         group: SizedGroup,
@@ -377,9 +407,9 @@ class ModifyBarStep(ModifyBodyStep):
         faded: bool = False,
         dim_ref_pt: tuple[float, float] | None = None,
     ) -> None:
+        group.append(draw.Use(self.outline, x, y))
         for key, face in self.bar.faces.items():
             y_face = y + self.ys[key]
-            face.draw(group, x, y_face)
 
             # annotate face
             if not close_up:
@@ -402,14 +432,30 @@ class ModifyBarStep(ModifyBodyStep):
                 self.step.draw(group, x, y_face, active, dimensions, faded=faded, dim_ref_pt=dim_ref_pt)
                 self._transfer_step_to_other_faces(group, x, y, active, dimensions, faded=faded)
 
-    def _transfer_step_to_other_faces(self, group: SizedGroup, x=0, y=0, active: bool = True, dimensions: bool = True, faded: bool = False) -> None:
+    def _transfer_step_to_other_faces(
+            self,
+            group: SizedGroup,
+            x=0,
+            y=0,
+            active: bool = True,
+            dimensions: bool = True,
+            faded: bool = False,
+    ) -> None:
+        """Project the step onto the other faces of the bar.
+
+        The projected lines and depth fills are added to the batch of `group`, so that the projections of all steps
+        drawn into it share one path per style. If the group has no batch, they are drawn as one path per style.
+        """
         fill_opacity = 0.4 if faded else 1
         stroke_opacity = 0.4 if faded else 1
         if isinstance(self.step, DrillHole):
+            batch = group.batch if group.batch is not None else PathBatch()
+
             if self.step.through:
                 # transfer step to opposite face
                 face = self.bar.get_opposite_face(self.face_identifier)
-                self.step.clone(y=face.height - self.step.y).draw(group, x, y + self.ys[face.identifier], False, False, faded=faded)
+                glyph = get_hole_glyph(self.step.diameter, self.step.through, get_color(False), faded)
+                group.append(draw.Use(glyph, x + self.step.x, y + self.ys[face.identifier] + face.height - self.step.y))
 
             # transfer step to adjacent faces
             for face, face_sign in zip(self.bar.get_adjacent_faces(self.face_identifier), [1, -1]):
@@ -417,19 +463,18 @@ class ModifyBarStep(ModifyBodyStep):
                 y_face = y + self.ys[face.identifier]
                 if not self.step.through:
                     y0 = y_face if face_sign >= 0 else y_face + face.height - height
-                    y1 = y0 + height
-                    group.append(draw.Rectangle(
+                    batch.add_rectangle(
                         x + self.step.x - self.step.radius,
                         y0,
                         self.step.diameter,
-                        y1 - y0,
+                        height,
                         stroke='none',
                         fill='gray',
                         fill_opacity=0.25 * fill_opacity,
-                    ))
+                    )
                     y0 = y_face if face_sign >= 0 else y_face + face.height
                     y1 = y0 + face_sign * height
-                    group.append(draw.Line(
+                    batch.add_line(
                         x + self.step.x - self.step.radius,
                         y1,
                         x + self.step.x + self.step.radius,
@@ -437,16 +482,21 @@ class ModifyBarStep(ModifyBodyStep):
                         stroke='gray',
                         stroke_opacity=stroke_opacity,
                         stroke_dasharray=DASH,
-                    ))
+                        fill='none',
+                    )
                 y0 = y_face if face_sign >= 0 else y_face + face.height
                 y1 = y0 + face_sign * height
                 for sign in [-1, 1]:
-                    group.append(draw.Line(
+                    batch.add_line(
                         x + self.step.x + sign * self.step.radius,
                         y0,
                         x + self.step.x + sign * self.step.radius,
                         y1,
                         stroke='gray',
+                        stroke_opacity=1,
                         stroke_dasharray=DASH,
                         fill='none',
-                    ))
+                    )
+
+            if group.batch is None:
+                batch.draw(group)
@@ -3,7 +3,7 @@ import math
 import drawsvg as draw
 from drawsvg import Drawing, Group
 
-from .base import Step
+from .base import Marker, Step
 from ..dimensions import (
     ANNOTATION_DIMENSION_X_OFFSET_OFFSET,
     ANNOTATION_OFFSET,
@@ -11,6 +11,7 @@ from ..dimensions import (
     FONT_SIZE_BASE,
 )
 from ..layout_base import SizedGroup, ViewBox
+from ..symbols import get_hole_glyph
 from ..style import DIMENSIONS_FONT_COLOR, FONT_FAMILY_TECH
 from ..utils import draw_position, get_position_text, get_color, disp, get_position_text_x
 
@@ -80,6 +81,11 @@ class DrillHole(Step):
                 res += "U"
         return res
 
+    def get_lod_markers(self, min_size: float) -> list[Marker] | None:
+        if self.diameter >= min_size:
+            return None
+        return [('dot', self.x, self.y)]
+
     def get_instruction(self, dim_ref_pt: tuple[float, float] | None = None) -> str:
         if dim_ref_pt is None:
             dim_ref_pt = (0, 0)
@@ -113,11 +119,8 @@ class DrillHole(Step):
         if dim_ref_pt is None:
             dim_ref_pt = (0, 0)
 
-        color = get_color(active)
-        stroke_opacity = 0.4 if faded else 1
-        fill = 'none' if self.through else 'gray'
-        fill_opacity = 0.2 if faded else 0.5
-        group.append(draw.Circle(x + self.x, y + self.y, self.radius, stroke=color, stroke_opacity=stroke_opacity, fill=fill, fill_opacity=fill_opacity))
+        glyph = get_hole_glyph(self.diameter, self.through, get_color(active), faded)
+        group.append(draw.Use(glyph, x + self.x, y + self.y))
 
         if dimensions:
             draw_position(group, x + dim_ref_pt[0], x + self.x, y + dim_ref_pt[1], y + self.y)
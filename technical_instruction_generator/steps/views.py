@@ -7,8 +7,18 @@ from ..layout_base import SizedGroup, ViewBox
 
 
 class View:
-    def __init__(self, steps: list[Step]):
+    def __init__(self, steps: list[Step], history: draw.Group | None = None):
         self.steps = steps
+        self.history = history
+
+    @property
+    @abstractmethod
+    def view_box(self) -> ViewBox:
+        raise NotImplementedError
+
+    @property
+    def size(self) -> tuple[int, int]:
+        return self.view_box.width, self.view_box.height
 
     @abstractmethod
     def get_group(self) -> SizedGroup:
@@ -20,11 +30,21 @@ class View:
     def get_clip_path(self) -> draw.ClipPath | None:
         return None
 
+    def _draw_history(self, group: SizedGroup, close_up: bool = False) -> None:
+        if self.history is not None:
+            group.append(draw.Use(self.history, 0, 0))
+            return
+
+        for step in self.steps[:-1]:
+            step.draw(group, active=False, dimensions=False, close_up=close_up)
+
 
 class FullView(View):
-    def __init__(self, *args, **kwargs):
+    def __init__(self, *args, view_box: ViewBox | None = None, **kwargs):
         super().__init__(*args, **kwargs)
-        self._view_box = ViewBox.combine([step.view_box for step in self.steps])
+        if view_box is None:
+            view_box = ViewBox.combine([step.view_box for step in self.steps])
+        self._view_box = view_box
 
     @property
     def view_box(self):
@@ -32,8 +52,7 @@ class FullView(View):
 
     def get_group(self) -> SizedGroup:
         group = SizedGroup(width=self.view_box.width, height=self.view_box.height, flip_y=True)
-        for step in self.steps[:-1]:
-            step.draw(group, active=False, dimensions=False)
+        self._draw_history(group)
         self.steps[-1].draw(group, active=True, dimensions=False)
         return group
 
@@ -61,10 +80,17 @@ class CloseUpView(View):
     def view_box(self) -> ViewBox:
         return self._view_box
 
+    @property
+    def visible_box(self) -> ViewBox:
+        """Region of the step drawings shown by the view.
+
+        Groups are drawn flipped in y, so the region is the view box mirrored in y.
+        """
+        return ViewBox(self.view_box.x, -self.view_box.y, self.view_box.width, self.view_box.height)
+
     def get_group(self) -> SizedGroup:
         group = SizedGroup(width=self.view_box.width, height=self.view_box.height, flip_y=True)
-        for step in self.steps[:-1]:
-            step.draw(group, active=False, dimensions=False, close_up=True)
+        self._draw_history(group, close_up=True)
         self.steps[-1].draw(group, active=True, dimensions=True, close_up=True)
         return group
 
@@ -0,0 +1,52 @@
+"""Shared drawings of geometry repeated across steps and pages.
+
+Every function returns the same element for the same arguments. The elements are drawn with `draw.Use`, so they are
+written to `<defs>` once per page and referenced from there.
+"""
+from functools import cache
+
+import drawsvg as draw
+
+from .dimensions import A4_HEIGHT, A4_WIDTH, HEADER_SIZE
+from .style import INSTRUCTION_BOX_STROKE_COLOR
+
+
+@cache
+def get_page_background() -> draw.Rectangle:
+    return draw.Rectangle(0, 0, A4_WIDTH, A4_HEIGHT, fill='white')
+
+
+@cache
+def get_box_frame(width: float, height: float) -> draw.Group:
+    frame = draw.Group()
+    frame.append(draw.Rectangle(0, 0, width, height, fill='white', stroke=INSTRUCTION_BOX_STROKE_COLOR,
+                                stroke_width=2, rx='5', ry='5'))
+    frame.append(draw.Line(0, HEADER_SIZE, width, HEADER_SIZE, stroke=INSTRUCTION_BOX_STROKE_COLOR))
+    return frame
+
+
+@cache
+def get_face_outline(width: float, height: float) -> draw.Rectangle:
+    return draw.Rectangle(0, 0, width, height, stroke='black', fill='none')
+
+
+@cache
+def get_bar_outline(faces: tuple[tuple[float, float, float], ...]) -> draw.Group:
+    """Outline of the faces of a bar laid out below each other, given as `(y, width, height)` per face."""
+    outline = draw.Group()
+    for y, width, height in faces:
+        outline.append(draw.Rectangle(0, y, width, height, stroke='black', fill='none'))
+    return outline
+
+
+@cache
+def get_hole_glyph(diameter: float, through: bool, color: str, faded: bool) -> draw.Circle:
+    return draw.Circle(
+        0,
+        0,
+        diameter / 2,
+        stroke=color,
+        stroke_opacity=0.4 if faded else 1,
+        fill='none' if through else 'gray',
+        fill_opacity=0.2 if faded else 0.5,
+    )
@@ -5,6 +5,7 @@ from typing import Any, Iterable
 import drawsvg as draw
 
 from .dimensions import ANNOTATION_OFFSET, DIMENSIONS_TEXT_OFFSET, FONT_SIZE_BASE
+from .labels import get_label_width
 from .layout_base import SizedGroup
 from .style import ACTIVE_STROKE_COLOR, DASH, DIMENSIONS_FONT_COLOR, DIMENSIONS_LINE_COLOR, FONT_FAMILY_TECH
 
@@ -114,8 +115,9 @@ def get_position_text_y(x: float, y0: float, y1: float) -> draw.Text:
     )
 
 
-def get_text_background(text: Any) -> draw.Rectangle:
-    width = len(text.escaped_text) * text.args['font-size']
+def get_text_bounds(text: Any) -> tuple[float, float, float, float]:
+    """Return `(x, y, width, height)` of the area covered by a text, estimated from the font's advance widths."""
+    width = get_label_width(text)
     height = text.args['font-size']
     text_anchor = text.args.get('text-anchor', 'start')
     if text_anchor == 'start':
@@ -131,4 +133,36 @@ def get_text_background(text: Any) -> draw.Rectangle:
         y = -height / 2
     else:
         y = 0
-    return draw.Rectangle(x + text.args['x'], y + text.args['y'], width, height, fill='white')
\ No newline at end of file
+    return x + text.args['x'], y + text.args['y'], width, height
+
+
+def get_text_background(text: Any) -> draw.Rectangle:
+    return draw.Rectangle(*get_text_bounds(text), fill='white')
+
+
+class PathBatch:
+    """Collects lines and rectangles and draws them as one `<path>` per distinct style."""
+
+    def __init__(self) -> None:
+        self._paths: dict[tuple[tuple[str, Any], ...], list[str]] = {}
+
+    def __len__(self) -> int:
+        return len(self._paths)
+
+    def add_line(self, x0: float, y0: float, x1: float, y1: float, **style: Any) -> None:
+        self._get_commands(style).append(f"M{x0},{y0}L{x1},{y1}")
+
+    def add_rectangle(self, x: float, y: float, width: float, height: float, **style: Any) -> None:
+        self._get_commands(style).append(f"M{x},{y}h{width}v{height}h{-width}Z")
+
+    def update(self, other: 'PathBatch') -> None:
+        """Add the lines and rectangles of `other`."""
+        for style, commands in other._paths.items():
+            self._paths.setdefault(style, []).extend(commands)
+
+    def draw(self, group: draw.Group) -> None:
+        for style, commands in self._paths.items():
+            group.append(draw.Path(d="".join(commands), **dict(style)))
+
+    def _get_commands(self, style: dict[str, Any]) -> list[str]:
+        return self._paths.setdefault(tuple(sorted(style.items())), [])
@@ -0,0 +1,282 @@
+import base64
+import gzip
+import hashlib
+import io
+import os
+import re
+import weakref
+from abc import ABC, abstractmethod
+from pathlib import Path
+from typing import BinaryIO
+from xml.sax.saxutils import unescape
+
+import drawsvg as draw
+from lxml import etree
+
+SVG_NAMESPACE = "http://www.w3.org/2000/svg"
+XLINK_NAMESPACE = "http://www.w3.org/1999/xlink"
+XLINK_DECLARATION = f' xmlns:xlink="{XLINK_NAMESPACE}"'.encode()
+
+STYLE_ATTRIBUTES = (
+    'stroke', 'stroke-width', 'stroke-opacity', 'stroke-dasharray', 'fill', 'fill-opacity', 'font-family',
+    'font-weight', 'text-anchor', 'dominant-baseline', 'stroke-linejoin', 'paint-order',
+)
+COORDINATE_ATTRIBUTES = (
+    'x', 'y', 'dx', 'dy', 'width', 'height', 'cx', 'cy', 'r', 'rx', 'ry', 'x1', 'y1', 'x2', 'y2', 'd', 'points',
+    'font-size',
+)
+NUMBER_PATTERN = re.compile(r"-?(?:\d+\.\d*|\.\d+)(?:e[-+]?\d+)?")
+
+
+def get_children(element: draw.DrawingElement) -> list[draw.DrawingElement]:
+    """Return the children of a drawsvg element in drawing order."""
+    children = list(getattr(element, 'children', ()))
+    for z in sorted(getattr(element, 'ordered_children', {})):
+        children.extend(element.ordered_children[z])
+    return children
+
+
+class PageWriter(ABC):
+    suffix = ".svg"
+
+    @abstractmethod
+    def write(self, drawing: draw.Drawing, path: Path | BinaryIO) -> None:
+        raise NotImplementedError
+
+    @property
+    def key(self) -> str:
+        """Identifies the writer and its options, pages written with the same key are interchangeable."""
+        return type(self).__qualname__
+
+    def to_bytes(self, drawing: draw.Drawing) -> bytes:
+        """Return the contents `write` would write to a file."""
+        buffer = io.BytesIO()
+        self.write(drawing, buffer)
+        return buffer.getvalue()
+
+
+class DrawsvgWriter(PageWriter):
+    def write(self, drawing: draw.Drawing, path: Path | BinaryIO) -> None:
+        if isinstance(path, (str, os.PathLike)):
+            drawing.save_svg(path)
+        else:
+            path.write(drawing.as_svg().encode())
+
+
+class LxmlWriter(PageWriter):
+    """Writes pages incrementally, serializing one element at a time with lxml.
+
+    Elements referenced by `<use>` or `clip-path` (e.g. the cached step histories shared by many pages) are converted
+    once and kept as long as the referenced drawsvg element is alive. The references and class names of the page are
+    collected from the drawsvg elements first, so that `<defs>` and the stylesheet can be written before the page's
+    elements. These are then converted and written one top-level element at a time, so at most one of them is held
+    as an lxml tree. Only the root element declares the xlink namespace. Generated ids and class names are derived
+    from the content, so an unchanged page is written byte for byte the same, whichever pages were written before.
+
+    For compact output, `precision` rounds coordinates to the given number of decimals, `classes` moves the
+    presentation attributes (stroke, fill, fonts, ...) into a stylesheet with one class per combination and
+    `compress` writes gzip-compressed `.svgz` files.
+    """
+
+    def __init__(self, precision: int | None = None, classes: bool = False, compress: bool = False) -> None:
+        self.precision = precision
+        self.classes = classes
+        self.compress = compress
+        self._defs: dict[int, tuple[str, etree._Element, list[draw.DrawingElement]]] = {}
+        self._refs: dict[int, weakref.ref] = {}
+        self._styles: dict[tuple[tuple[str, str], ...], str] = {}
+        self._class_styles: dict[str, tuple[tuple[str, str], ...]] = {}
+
+    @property
+    def suffix(self) -> str:
+        return ".svgz" if self.compress else ".svg"
+
+    @property
+    def key(self) -> str:
+        return f"{super().key}:{self.precision}:{self.classes}:{self.compress}"
+
+    def __getstate__(self) -> dict:
+        # the converted elements belong to drawsvg elements of this process, only the options are passed on
+        return {**vars(self), '_defs': {}, '_refs': {}, '_styles': {}, '_class_styles': {}}
+
+    def write(self, drawing: draw.Drawing, path: Path | BinaryIO) -> None:
+        if isinstance(path, (str, os.PathLike)):
+            with open(path, 'wb') as file:
+                self._write_file(drawing, file)
+        else:
+            self._write_file(drawing, path)
+
+    def _write_file(self, drawing: draw.Drawing, file: BinaryIO) -> None:
+        if not self.compress:
+            self._write(drawing, file)
+            return
+        # without a time in the gzip header, so that equal pages are written equally
+        with gzip.GzipFile(filename='', mode='wb', compresslevel=6, fileobj=file, mtime=0) as gzip_file:
+            self._write(drawing, gzip_file)
+
+    def _write(self, drawing: draw.Drawing, file: BinaryIO) -> None:
+        width, height = drawing.calc_render_size()
+        svg_args = {'width': width, 'height': height, 'viewBox': ' '.join(map(str, drawing.view_box))}
+        svg_args.update(drawing.svg_args)
+        svg = etree.Element(
+            'svg', {k: str(v) for k, v in svg_args.items()}, nsmap={None: SVG_NAMESPACE, 'xlink': XLINK_NAMESPACE}
+        )
+
+        elements = drawing.all_elements()
+        refs = list(drawing.other_defs)
+        class_names = set()
+        for element in elements:
+            self._collect(element, refs, class_names)
+
+        file.write(b"<?xml version='1.0' encoding='utf-8'?>\n")
+        file.write(etree.tostring(svg, encoding='utf-8')[:-2] + b">")
+        file.write(b"<defs>")
+        defs = self._get_defs(refs)
+        if self.classes:
+            class_names.update(self._get_class_names(defs))
+            if class_names:
+                style = etree.Element('style')
+                style.text = self._get_stylesheet(sorted(class_names))
+                file.write(etree.tostring(style, encoding='utf-8'))
+        for converted in defs:
+            file.write(self._serialize(converted))
+        file.write(b"</defs>")
+
+        for element in elements:
+            file.write(self._serialize(self._convert(element)[1]))
+        file.write(b"</svg>")
+
+    @staticmethod
+    def _serialize(converted: etree._Element) -> bytes:
+        # the element declares the xlink namespace to serialize its references with the `xlink` prefix, the root
+        # element of the page declares it already
+        return etree.tostring(converted, encoding='utf-8').replace(XLINK_DECLARATION, b"", 1)
+
+    def _get_defs(self, refs: list[draw.DrawingElement]) -> list[etree._Element]:
+        """Return the converted elements referenced by `refs`, directly or through other references."""
+        defs = {}
+        seen = set()
+        stack = list(refs)
+        while stack:
+            element = stack.pop()
+            if id(element) in seen:
+                continue
+            seen.add(id(element))
+            # elements with the same content get the same id and are written once
+            element_id, converted, element_refs = self._get_def(element)
+            defs.setdefault(element_id, converted)
+            stack.extend(element_refs)
+        return list(defs.values())
+
+    def _get_def(self, element: draw.DrawingElement) -> tuple[str, etree._Element, list[draw.DrawingElement]]:
+        entry = self._defs.get(id(element))
+        if entry is None:
+            refs, converted = self._convert(element)
+            if element.id is not None:
+                element_id = element.id
+            else:
+                digest = hashlib.blake2b(etree.tostring(converted), digest_size=6).digest()
+                element_id = f"h{base64.urlsafe_b64encode(digest).decode()}"
+            converted.set('id', element_id)
+            entry = self._defs[id(element)] = element_id, converted, refs
+            self._refs[id(element)] = weakref.ref(element, lambda _, key=id(element): self._forget(key))
+        return entry
+
+    def _forget(self, key: int) -> None:
+        self._defs.pop(key, None)
+        self._refs.pop(key, None)
+
+    def _collect(self, element: draw.DrawingElement, refs: list[draw.DrawingElement], class_names: set[str]) -> None:
+        """Collect the elements `element` and its descendants reference and the class names they are written with."""
+        style = []
+        for key, value in element.args.items():
+            if isinstance(value, draw.DrawingElement):
+                refs.append(value)
+            if self.classes and value is not None and key in STYLE_ATTRIBUTES:
+                style.append((key, self._format_value(key, value)))
+        if style:
+            class_names.add(self._get_class(tuple(style)))
+
+        for child in get_children(element):
+            self._collect(child, refs, class_names)
+
+    def _convert(
+            self,
+            element: draw.DrawingElement,
+            parent: etree._Element | None = None,
+            refs: list[draw.DrawingElement] | None = None,
+    ) -> tuple[list[draw.DrawingElement], etree._Element]:
+        """Convert a drawsvg element to lxml and return it together with the elements it references."""
+        if refs is None:
+            refs = []
+
+        if parent is None:
+            converted = etree.Element(element.TAG_NAME, nsmap={'xlink': XLINK_NAMESPACE})
+        else:
+            converted = etree.SubElement(parent, element.TAG_NAME)
+
+        style = []
+        for key, value in element.args.items():
+            if value is None:
+                continue
+            if isinstance(value, draw.DrawingElement):
+                refs.append(value)
+            value = self._format_value(key, value)
+            if self.classes and key in STYLE_ATTRIBUTES:
+                style.append((key, value))
+                continue
+            if key.startswith('xlink:'):
+                key = f"{{{XLINK_NAMESPACE}}}{key[6:]}"
+            converted.set(key, value)
+
+        if style:
+            converted.set('class', self._get_class(tuple(style)))
+
+        escaped_text = getattr(element, 'escaped_text', None)
+        if escaped_text:
+            converted.text = unescape(escaped_text)
+
+        for child in get_children(element):
+            self._convert(child, converted, refs)
+
+        return refs, converted
+
+    def _format_value(self, key: str, value: object) -> str:
+        if isinstance(value, draw.DrawingElement):
+            ref_id = self._get_def(value)[0]
+            return f"#{ref_id}" if key == 'xlink:href' else f"url(#{ref_id})"
+        if self.precision is not None and key in COORDINATE_ATTRIBUTES:
+            return self._quantize(value)
+        return str(value)
+
+    def _quantize(self, value: object) -> str:
+        if isinstance(value, (int, float)):
+            return self._format_number(value)
+        return NUMBER_PATTERN.sub(lambda match: self._format_number(float(match.group())), str(value))
+
+    def _format_number(self, value: float) -> str:
+        res = f"{value:.{self.precision}f}"
+        if '.' in res:
+            res = res.rstrip('0').rstrip('.')
+        return "0" if res == "-0" else res
+
+    def _get_class(self, style: tuple[tuple[str, str], ...]) -> str:
+        class_name = self._styles.get(style)
+        if class_name is None:
+            class_name = f"s{hashlib.blake2b(repr(style).encode(), digest_size=4).hexdigest()}"
+            self._styles[style] = class_name
+            self._class_styles[class_name] = style
+        return class_name
+
+    @staticmethod
+    def _get_class_names(elements: list[etree._Element]) -> set[str]:
+        """Return the class names used by `elements` or their descendants."""
+        return {
+            node.get('class') for converted in elements for node in converted.iter() if node.get('class') is not None
+        }
+
+    def _get_stylesheet(self, class_names: list[str]) -> str:
+        return "".join(
+            f".{class_name}{{{';'.join(f'{key}:{value}' for key, value in self._class_styles[class_name])}}}"
+            for class_name in class_names
+        )
@@ -0,0 +1,66 @@
+import io
+from functools import cache
+from typing import Callable
+
+import pytest
+from PyPDF2 import PdfWriter
+
+from technical_instruction_generator.converters import Converter
+from technical_instruction_generator.instructions import Instructions
+from technical_instruction_generator.steps.bodies import Bar, ModifyBarStep
+from technical_instruction_generator.steps.drilling import DrillHole
+
+
+@cache
+def get_blank_pdf() -> bytes:
+    writer = PdfWriter()
+    writer.add_blank_page(595, 842)
+    buffer = io.BytesIO()
+    writer.write(buffer)
+    return buffer.getvalue()
+
+
+class BlankConverter(Converter):
+    """Converts pages to blank PDFs and counts them. With `fail_after`, fails on the page after that many pages."""
+
+    def __init__(self, name: str = "blank", fail_after: int | None = None) -> None:
+        self.name = name
+        self.fail_after = fail_after
+        self.n_pages = 0
+
+    @classmethod
+    def is_available(cls) -> bool:
+        return True
+
+    async def convert(self, svg: bytes) -> bytes:
+        if self.n_pages == self.fail_after:
+            raise RuntimeError("broken page")
+        self.n_pages += 1
+        return get_blank_pdf()
+
+
+@pytest.fixture
+def make_converter() -> Callable[..., BlankConverter]:
+    """Return the factory of converters to blank PDFs, see `BlankConverter`."""
+    return BlankConverter
+
+
+@pytest.fixture
+def make_steps() -> Callable[[int], list[ModifyBarStep]]:
+    """Return a factory of steps drilling `n_holes` holes into one bar."""
+    def make(n_holes: int) -> list[ModifyBarStep]:
+        bar = Bar("1.1", 42, 48, 1000)
+        return [
+            ModifyBarStep(
+                bar, 'DABC'[i % 4], DrillHole(20 + 15 * i, 21, 8 if i % 2 else 20, 0 if i % 2 else 12, bool(i % 2))
+            )
+            for i in range(n_holes)
+        ]
+
+    return make
+
+
+@pytest.fixture
+def make_instructions(make_steps) -> Callable[[int], Instructions]:
+    """Return a factory of instructions drilling `n_holes` holes into one bar."""
+    return lambda n_holes: Instructions(make_steps(n_holes), title="Test")
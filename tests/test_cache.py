@@ -0,0 +1,98 @@
+from pathlib import Path
+from typing import BinaryIO
+
+import drawsvg as draw
+
+from technical_instruction_generator.cache import RenderCache, get_step_keys
+from technical_instruction_generator.writers import LxmlWriter
+
+
+class CountingWriter(LxmlWriter):
+    """Counts the pages it writes."""
+
+    def __init__(self, *args, **kwargs) -> None:
+        super().__init__(*args, **kwargs)
+        self.n_pages = 0
+
+    def write(self, drawing: draw.Drawing, path: Path | BinaryIO) -> None:
+        self.n_pages += 1
+        super().write(drawing, path)
+
+
+def test_step_keys_depend_on_step_and_history(make_steps):
+    keys = get_step_keys(make_steps(6))
+    assert get_step_keys(make_steps(6)) == keys
+    assert len(set(keys)) == len(keys)
+
+    steps = make_steps(6)
+    steps[3].step.diameter += 1
+    changed_keys = get_step_keys(steps)
+    # the steps after the changed one have it in their history
+    assert changed_keys[:3] == keys[:3]
+    assert all(changed != key for changed, key in zip(changed_keys[3:], keys[3:]))
+
+
+def test_render_cache_get_and_put(tmp_path):
+    cache = RenderCache(tmp_path)
+    assert cache.get("abcd", ".pdf") is None
+    cache.put("abcd", ".pdf", b"page")
+    assert cache.get("abcd", ".pdf") == b"page"
+    assert cache.get("abcd", ".svg") is None
+
+
+def test_render_cache_evicts_least_recently_used(tmp_path):
+    cache = RenderCache(tmp_path, max_size=250)
+    for key in ("aa00", "bb00"):
+        cache.put(key, ".pdf", bytes(100))
+    cache.get("aa00", ".pdf")  # later use than "bb00"
+    cache.put("cc00", ".pdf", bytes(100))
+
+    assert cache.get("bb00", ".pdf") is None
+    assert cache.get("aa00", ".pdf") is not None
+    assert cache.get("cc00", ".pdf") is not None
+
+
+def test_save_pdf_converts_changed_pages_only(make_instructions, make_converter, tmp_path):
+    cache = RenderCache(tmp_path / "cache")
+    instructions = make_instructions(20)
+    n_pages = len(instructions.plan())
+    assert n_pages > 1
+
+    converter = make_converter()
+    instructions.save_pdf(tmp_path / "cold.pdf", jobs=1, converter=converter, cache=cache)
+    assert converter.n_pages == n_pages
+
+    converter = make_converter()
+    make_instructions(20).save_pdf(tmp_path / "warm.pdf", jobs=1, converter=converter, cache=cache)
+    assert converter.n_pages == 0
+    assert (tmp_path / "warm.pdf").read_bytes() == (tmp_path / "cold.pdf").read_bytes()
+
+    # the last step is drawn on the last page only
+    instructions = make_instructions(20)
+    instructions.steps[-1].step.diameter += 1
+    converter = make_converter()
+    instructions.save_pdf(tmp_path / "changed.pdf", jobs=1, converter=converter, cache=cache)
+    assert converter.n_pages == 1
+
+    converter = make_converter("other")
+    make_instructions(20).save_pdf(tmp_path / "other.pdf", jobs=1, converter=converter, cache=cache)
+    assert converter.n_pages == n_pages
+
+
+def test_save_svgs_writes_changed_pages_only(make_instructions, tmp_path):
+    cache = RenderCache(tmp_path / "cache")
+    n_pages = len(make_instructions(20).plan())
+
+    writer = CountingWriter()
+    make_instructions(20).save_svgs(tmp_path / "cold" / "i.svg", writer=writer, cache=cache)
+    assert writer.n_pages == n_pages
+
+    writer = CountingWriter()
+    make_instructions(20).save_svgs(tmp_path / "warm" / "i.svg", writer=writer, cache=cache)
+    assert writer.n_pages == 0
+    cold = sorted(path.read_bytes() for path in (tmp_path / "cold").iterdir())
+    assert sorted(path.read_bytes() for path in (tmp_path / "warm").iterdir()) == cold
+
+    writer = CountingWriter(precision=1)
+    make_instructions(20).save_svgs(tmp_path / "precision" / "i.svg", writer=writer, cache=cache)
+    assert writer.n_pages == n_pages
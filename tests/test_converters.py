@@ -0,0 +1,65 @@
+import asyncio
+import sys
+
+import pytest
+
+from technical_instruction_generator.converters import InkscapeShellConverter
+
+# prints `FAKE_WARNINGS` bytes of warnings and takes `FAKE_DELAY` seconds per page
+FAKE_INKSCAPE = f"""#!{sys.executable}
+import os, sys, time
+from PyPDF2 import PdfWriter
+
+sys.stdout.write("Inkscape interactive shell mode.\\n> ")
+sys.stdout.flush()
+for line in sys.stdin:
+    if line.strip() == 'quit':
+        break
+    actions = dict(action.split(':', 1) if ':' in action else (action, '') for action in line.strip().split(';'))
+    time.sleep(float(os.environ.get('FAKE_DELAY', 0)))
+    sys.stdout.write("WARNING: unsupported feature\\n" * (int(os.environ.get('FAKE_WARNINGS', 0)) // 29))
+    writer = PdfWriter()
+    writer.add_blank_page(210, 297)
+    writer.write(actions['export-filename'])
+    sys.stdout.write("> ")
+    sys.stdout.flush()
+"""
+
+
+@pytest.fixture
+def fake_inkscape(tmp_path) -> str:
+    path = tmp_path / "inkscape"
+    path.write_text(FAKE_INKSCAPE)
+    path.chmod(0o755)
+    return str(path)
+
+
+def test_inkscape_shell_reads_long_output(fake_inkscape, monkeypatch):
+    # more than the 64 KiB the stream reader buffers by default
+    monkeypatch.setenv('FAKE_WARNINGS', str(200_000))
+    converter = InkscapeShellConverter(fake_inkscape, workers=1)
+
+    async def convert() -> list[bytes]:
+        try:
+            return [await converter.convert(b"<svg/>") for _ in range(2)]
+        finally:
+            await converter.close()
+
+    pdfs = asyncio.run(convert())
+    assert all(pdf.startswith(b"%PDF") for pdf in pdfs)
+
+
+def test_inkscape_shell_close_fails_waiting_pages(fake_inkscape, monkeypatch):
+    monkeypatch.setenv('FAKE_DELAY', "0.5")
+    converter = InkscapeShellConverter(fake_inkscape, workers=1)
+
+    async def convert() -> list[bytes | BaseException]:
+        # the second page waits for the only shell, which the first page uses
+        conversions = [asyncio.create_task(converter.convert(b"<svg/>")) for _ in range(2)]
+        await asyncio.sleep(0.2)
+        await converter.close()
+        return await asyncio.wait_for(asyncio.gather(*conversions, return_exceptions=True), 10)
+
+    running, waiting = asyncio.run(convert())
+    assert running.startswith(b"%PDF")
+    assert isinstance(waiting, RuntimeError) and "closed" in str(waiting)
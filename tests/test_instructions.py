@@ -0,0 +1,64 @@
+import threading
+import time
+
+import pytest
+from PyPDF2 import PdfReader
+
+from technical_instruction_generator.merge import PdfStreamMerger
+from technical_instruction_generator.pdf import PdfDocument
+
+
+def test_save_pdf_fails_without_hanging(make_instructions, make_converter, tmp_path):
+    instructions = make_instructions(120)
+    # more pages than the default `max_pending_pages`, so rendering waits for the failed converters
+    assert len(instructions.plan()) > 2 * 8
+
+    errors = []
+
+    def save() -> None:
+        try:
+            instructions.save_pdf(tmp_path / "out.pdf", jobs=2, converter=make_converter(fail_after=2))
+        except RuntimeError as e:
+            errors.append(e)
+
+    thread = threading.Thread(target=save, daemon=True)
+    thread.start()
+    thread.join(60)
+    assert not thread.is_alive(), "save_pdf hangs after a failed conversion"
+    assert len(errors) == 1 and "broken page" in str(errors[0])
+    assert not (tmp_path / "out.pdf").exists()
+
+
+def test_save_pdf_removes_partial_pdf_before_raising(make_instructions, make_converter, tmp_path, monkeypatch):
+    abort = PdfStreamMerger.abort
+
+    def slow_abort(self: PdfStreamMerger) -> None:
+        time.sleep(0.2)
+        abort(self)
+
+    monkeypatch.setattr(PdfStreamMerger, 'abort', slow_abort)
+    with pytest.raises(RuntimeError, match="broken page"):
+        make_instructions(20).save_pdf(tmp_path / "out.pdf", jobs=2, converter=make_converter(fail_after=1))
+    assert not (tmp_path / "out.pdf").exists()
+
+
+def test_save_pdf_direct_replaces_pdf_when_complete(make_instructions, tmp_path):
+    make_instructions(20).save_pdf_direct(tmp_path / "out.pdf", linearize=True)
+    assert len(PdfReader(tmp_path / "out.pdf").pages) == len(make_instructions(20).plan())
+    assert [path.name for path in tmp_path.iterdir()] == ["out.pdf"]
+
+
+def test_save_pdf_direct_keeps_existing_pdf_on_failure(make_instructions, tmp_path, monkeypatch):
+    (tmp_path / "out.pdf").write_bytes(b"old")
+    add_page = PdfDocument.add_page
+
+    def failing_add_page(self: PdfDocument, drawing) -> None:
+        if self._page_numbers:
+            raise RuntimeError("broken page")
+        add_page(self, drawing)
+
+    monkeypatch.setattr(PdfDocument, 'add_page', failing_add_page)
+    with pytest.raises(RuntimeError, match="broken page"):
+        make_instructions(20).save_pdf_direct(tmp_path / "out.pdf")
+    assert [path.name for path in tmp_path.iterdir()] == ["out.pdf"]
+    assert (tmp_path / "out.pdf").read_bytes() == b"old"
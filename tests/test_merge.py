@@ -0,0 +1,84 @@
+import io
+
+import pikepdf
+from PyPDF2 import PdfReader
+
+from technical_instruction_generator.merge import PdfStreamMerger
+
+
+def make_pdf(*widths: int, object_streams: bool = False) -> bytes:
+    """Return a PDF with one page per width, drawing the same line on every page."""
+    pdf = pikepdf.new()
+    for width in widths:
+        pdf.add_blank_page(page_size=(width, 842))
+        pdf.pages[-1].Contents = pdf.make_stream(b"0 0 m 100 100 l S")
+    buffer = io.BytesIO()
+    mode = pikepdf.ObjectStreamMode.generate if object_streams else pikepdf.ObjectStreamMode.disable
+    pdf.save(buffer, object_stream_mode=mode)
+    return buffer.getvalue()
+
+
+def get_widths(path) -> tuple[list[float], list[float]]:
+    """Return the page widths of `path` as read by PyPDF2 and by pikepdf."""
+    reader = PdfReader(path)
+    with pikepdf.open(path) as pdf:
+        return (
+            [float(page.mediabox.width) for page in reader.pages],
+            [float(page.mediabox[2]) for page in pdf.pages],
+        )
+
+
+def test_merge_keeps_page_order(tmp_path):
+    path = tmp_path / "out.pdf"
+    with PdfStreamMerger(path) as merger:
+        merger.append(make_pdf(100, 200))
+        merger.append(make_pdf(300))
+
+    assert get_widths(path) == ([100, 200, 300], [100, 200, 300])
+
+
+def test_merge_appends_to_existing_pdf(tmp_path):
+    path = tmp_path / "out.pdf"
+    with PdfStreamMerger(path) as merger:
+        merger.append(make_pdf(100, 200))
+    with PdfStreamMerger(path, append=True) as merger:
+        merger.append(make_pdf(300))
+        merger.append(make_pdf(400))
+
+    assert get_widths(path) == ([100, 200, 300, 400], [100, 200, 300, 400])
+
+
+def test_merge_appends_to_pdf_with_object_streams(tmp_path):
+    path = tmp_path / "out.pdf"
+    path.write_bytes(make_pdf(100, 200, object_streams=True))
+    with PdfStreamMerger(path, append=True) as merger:
+        merger.append(make_pdf(300))
+
+    assert get_widths(path) == ([100, 200, 300], [100, 200, 300])
+
+
+def test_merge_abort_keeps_existing_pdf(tmp_path):
+    path = tmp_path / "out.pdf"
+    with PdfStreamMerger(path) as merger:
+        merger.append(make_pdf(100))
+    data = path.read_bytes()
+
+    merger = PdfStreamMerger(path, append=True)
+    merger.append(make_pdf(200))
+    merger.abort()
+
+    assert path.read_bytes() == data
+
+
+def test_merge_stores_duplicate_pages_once(tmp_path):
+    path = tmp_path / "out.pdf"
+    page = make_pdf(100)
+    with PdfStreamMerger(path) as merger:
+        for _ in range(3):
+            merger.append(page)
+
+    with pikepdf.open(path) as pdf:
+        assert len(pdf.pages) == 3
+        assert len({page.Contents.objgen for page in pdf.pages}) == 1
+        assert sum(isinstance(obj, pikepdf.Stream) for obj in pdf.objects) == 1
+    assert len(PdfReader(path).pages) == 3
@@ -0,0 +1,51 @@
+import gzip
+
+import drawsvg as draw
+import pytest
+from lxml import etree
+
+from technical_instruction_generator.writers import SVG_NAMESPACE, XLINK_NAMESPACE, LxmlWriter
+
+
+def make_drawing() -> draw.Drawing:
+    circle = draw.Circle(0, 0, 4, stroke='black', fill='none')
+    group = draw.Group()
+    group.append(draw.Use(circle, 10, 10))
+    drawing = draw.Drawing(100, 100)
+    drawing.append(draw.Use(group, 0, 0))
+    drawing.append(draw.Use(group, 50, 0))
+    drawing.append(draw.Text("Fläche", 10, 20, 80, font_family='Georgia'))
+    return drawing
+
+
+@pytest.mark.parametrize('writer', [LxmlWriter(), LxmlWriter(precision=1, classes=True, compress=True)])
+def test_lxml_writer_declares_xlink_once(writer):
+    svg = writer.to_bytes(make_drawing())
+    if writer.compress:
+        svg = gzip.decompress(svg)
+
+    assert svg.count(b"xmlns:xlink") == 1
+    root = etree.fromstring(svg)
+    ids = {element.get('id') for element in root.iter()}
+    hrefs = [use.get(f"{{{XLINK_NAMESPACE}}}href") for use in root.iter(f"{{{SVG_NAMESPACE}}}use")]
+    assert len(hrefs) == 3 and all(href[1:] in ids for href in hrefs)
+    assert root.find(f"{{{SVG_NAMESPACE}}}text").text == "Fläche"
+
+
+def test_lxml_writer_writes_equal_pages_equally(tmp_path):
+    writer = LxmlWriter(classes=True)
+    writer.write(make_drawing(), tmp_path / "a.svg")
+    assert LxmlWriter(classes=True).to_bytes(make_drawing()) == (tmp_path / "a.svg").read_bytes()
+
+
+def test_lxml_writer_writes_paths_without_calling_write_again(tmp_path):
+    calls = []
+
+    class RecordingWriter(LxmlWriter):
+        def write(self, drawing: draw.Drawing, path) -> None:
+            calls.append(path)
+            super().write(drawing, path)
+
+    RecordingWriter(compress=True).write(make_drawing(), tmp_path / "a.svgz")
+    assert calls == [tmp_path / "a.svgz"]
+    assert gzip.decompress((tmp_path / "a.svgz").read_bytes()).startswith(b"<?xml")